@@ -1,16 +1,34 @@
 # -*- coding: utf-8 -*-
-import contextlib
 import gi
 import logging
 import os
 import pathlib
+import time
+from collections import OrderedDict
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gdk, GdkPixbuf, Gio, Gtk, Pango
+from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Gtk, Pango
+
+from ks_includes import startup
+from ks_includes.icon_pack import IconPack
 
 
 class KlippyGtk:
     labels = {}
+    # Icons shared by the whole process, keyed by (themedir, name, width, height),
+    # the least recently used are dropped past max_pixbuf_memory bytes
+    pixbufs = OrderedDict()
+    pixbuf_memory = 0
+    max_pixbuf_memory = 8 * 1024 * 1024
+    # Icons rasterized since the last save of the icon pack
+    unsaved_pixbufs = {}
+    # Resolved image files keyed by (themedir, name), None if the theme doesn't have it
+    image_paths = {}
+    image_stats = {"hits": 0, "misses": 0}
+    # Scales of img_scale used by the buttons, rendered ahead into the icon pack
+    icon_scales = (1.38, 1, .7, .66, .6, .5)
+    # Icons rendered per idle iteration while building the pack
+    icon_batch = 8
 
     def __init__(self, screen, width, height, theme, cursor, fontsize_type):
         self.screen = screen
@@ -48,6 +66,17 @@ class KlippyGtk:
 
         logging.debug(f"img width: {self.img_width} height: {self.img_height}")
 
+        key = {
+            "theme": theme,
+            "mtime": max((entry.stat().st_mtime for entry in os.scandir(self.themedir)), default=0),
+            "width": self.width,
+            "height": self.height,
+            "font_size": self.font_size,
+        }
+        self.icon_pack = IconPack(screen._config.get_cache_path("icons.pack"), self.themedir, key)
+        if not self.icon_pack.valid:
+            GLib.idle_add(self.build_icon_pack, self.get_icon_pack_list(), {}, priority=GLib.PRIORITY_LOW)
+
     def get_action_bar_width(self):
         return self.action_bar_width
 
@@ -112,16 +141,88 @@ class KlippyGtk:
     def Image(self, image_name=None, width=None, height=None):
         if image_name is None:
             return Gtk.Image()
+        pixbuf = self.PixbufFromIcon(image_name, width, height)
+        if pixbuf is None:
+            return Gtk.Image()
+        return Gtk.Image.new_from_pixbuf(pixbuf)
+
+    def get_image_path(self, image_name):
+        key = (self.themedir, image_name)
+        if key not in self.image_paths:
+            filename = os.path.join(self.themedir, image_name)
+            self.image_paths[key] = None
+            for ext in ["svg", "png"]:
+                if os.path.exists(f"{filename}.{ext}"):
+                    self.image_paths[key] = f"{filename}.{ext}"
+                    break
+            else:
+                logging.error(f"Unable to find image {filename}")
+        return self.image_paths[key]
+
+    def PixbufFromIcon(self, image_name, width=None, height=None):
         width = width if width is not None else self.img_width
         height = height if height is not None else self.img_height
-        filename = os.path.join(self.themedir, image_name)
-        for ext in ["svg", "png"]:
-            with contextlib.suppress(Exception):
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(f"{filename}.{ext}", int(width), int(height))
-                if pixbuf is not None:
-                    return Gtk.Image.new_from_pixbuf(pixbuf)
-        logging.error(f"Unable to find image {filename}.{ext}")
-        return Gtk.Image()
+        key = (self.themedir, image_name, int(width), int(height))
+        if key in self.pixbufs:
+            self.image_stats['hits'] += 1
+            self.pixbufs.move_to_end(key)
+            return self.pixbufs[key]
+        self.image_stats['misses'] += 1
+        start = time.perf_counter()
+        pixbuf = self.icon_pack.get(image_name, int(width), int(height))
+        if pixbuf is not None:
+            startup.add("icons from the pack", time.perf_counter() - start)
+        else:
+            pixbuf = self.rasterize_icon(image_name, int(width), int(height))
+            startup.add("icons rasterized", time.perf_counter() - start)
+            if pixbuf is not None:
+                self.unsaved_pixbufs[key] = pixbuf
+                self.icon_pack.schedule_save(self.unsaved_pixbufs)
+        self.add_pixbuf(key, pixbuf)
+        return pixbuf
+
+    def add_pixbuf(self, key, pixbuf):
+        cls = type(self)
+        cls.pixbufs[key] = pixbuf
+        if pixbuf is not None:
+            cls.pixbuf_memory += pixbuf.get_byte_length()
+        while cls.pixbuf_memory > cls.max_pixbuf_memory and len(cls.pixbufs) > 1:
+            evicted = cls.pixbufs.popitem(last=False)[1]
+            if evicted is not None:
+                cls.pixbuf_memory -= evicted.get_byte_length()
+
+    def rasterize_icon(self, image_name, width, height):
+        path = self.get_image_path(image_name)
+        if path is None:
+            return None
+        try:
+            return GdkPixbuf.Pixbuf.new_from_file_at_size(path, width, height)
+        except GLib.Error as e:
+            logging.error(f"Unable to load image {path}: {e}")
+            return None
+
+    def get_icon_pack_list(self):
+        sizes = {(int(self.img_width), int(self.img_height))}
+        sizes.update((int(self.img_scale * scale),) * 2 for scale in self.icon_scales)
+        names = sorted(os.path.splitext(name)[0] for name in os.listdir(self.themedir))
+        return [(name, width, height) for name in names for width, height in sizes]
+
+    def build_icon_pack(self, pending, rendered):
+        # Renders every icon of the theme in small batches, only kept until the pack is written
+        for _ in range(min(self.icon_batch, len(pending))):
+            name, width, height = pending.pop()
+            key = (self.themedir, name, width, height)
+            rendered[key] = self.pixbufs.get(key) or self.rasterize_icon(name, width, height)
+        if pending:
+            return True
+        rendered.update(self.unsaved_pixbufs)
+        self.icon_pack.save(rendered)
+        if self.icon_pack.valid:
+            self.unsaved_pixbufs.clear()
+        return False
+
+    def get_image_stats(self):
+        return {"hits": self.image_stats['hits'], "misses": self.image_stats['misses'], "cached": len(self.pixbufs)}
 
     @staticmethod
     def PixbufFromFile(filename, width=-1, height=-1):
@@ -1,13 +1,35 @@
 import json
 import requests
 import logging
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 class KlippyRest:
+    # Seconds to wait for the connection and for the response
+    connect_timeout = 3
+    read_timeout = 15
+    # Failed GET requests are retried with a growing delay: 0.5s, 1s...
+    retries = 2
+    backoff_factor = .5
+
     def __init__(self, ip, port=7125, api_key=False):
         self.ip = ip
         self.port = port
         self.api_key = api_key
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        retry = Retry(total=self.retries, backoff_factor=self.backoff_factor, allowed_methods=["GET"],
+                      status_forcelist=[502, 503, 504], raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if self.api_key is not False:
+            self.session.headers.update({"x-api-key": self.api_key})
 
     @property
     def endpoint(self):
@@ -16,6 +38,9 @@ class KlippyRest:
             protocol = "https"
         return f"{protocol}://{self.ip}:{self.port}"
 
+    def close(self):
+        self.session.close()
+
     def get_server_info(self):
         return self.send_request("server/info")
 
@@ -30,23 +55,16 @@ class KlippyRest:
 
     def get_thumbnail_stream(self, thumbnail):
         url = f"{self.endpoint}/server/files/gcodes/{thumbnail}"
-
-        response = requests.get(url, stream=True)
-        if response.status_code == 200:
-            response.raw.decode_content = True
+        response = self._get(url, "server/files/gcodes")
+        if response is not False and response.status_code == 200:
             return response.content
         return False
 
-    def send_request(self, method):
+    def send_request(self, method, timeout=None):
         url = f"{self.endpoint}/{method}"
         logging.debug(f"Sending request to {url}")
-        headers = {} if self.api_key is False else {"x-api-key": self.api_key}
-        try:
-            r = requests.get(url, headers=headers)
-        except Exception as e:
-            logging.error(e)
-            return False
-        if r.status_code != 200:
+        r = self._get(url, method.split("?")[0], timeout)
+        if r is False or r.status_code != 200:
             return False
 
         try:
@@ -56,3 +74,36 @@ class KlippyRest:
             return False
 
         return data
+
+    def _get(self, url, name, timeout=None):
+        start = time.monotonic()
+        try:
+            r = self.session.get(url, timeout=(self.connect_timeout, timeout or self.read_timeout))
+        except Exception as e:
+            logging.error(e)
+            self._add_stat(name, time.monotonic() - start, True)
+            return False
+        self._add_stat(name, time.monotonic() - start, r.status_code != 200)
+        return r
+
+    def _add_stat(self, name, latency, error=False):
+        with self._stats_lock:
+            if name not in self.stats:
+                self.stats[name] = {"count": 0, "errors": 0, "total": 0, "max": 0}
+            stat = self.stats[name]
+            stat['count'] += 1
+            stat['total'] += latency
+            stat['max'] = max(stat['max'], latency)
+            if error:
+                stat['errors'] += 1
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                name: {
+                    "count": stat['count'],
+                    "errors": stat['errors'],
+                    "avg": stat['total'] / stat['count'],
+                    "max": stat['max']
+                } for name, stat in self.stats.items()
+            }
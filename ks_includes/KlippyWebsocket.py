@@ -6,6 +6,9 @@ import threading
 import json
 import websocket
 import logging
+import time
+from concurrent.futures import Future
+from queue import Empty, SimpleQueue
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import GLib, Gdk
@@ -27,23 +30,55 @@ api = {
 }
 
 
+class RequestError(Exception):
+    pass
+
+
+class PendingRequest:
+    __slots__ = ("method", "params", "callback", "args", "future", "sent", "deadline")
+
+    def __init__(self, method, params, callback, args, future, timeout):
+        self.method = method
+        self.params = params
+        self.callback = callback
+        self.args = args
+        self.future = future
+        self.sent = time.monotonic()
+        self.deadline = None if timeout is None else self.sent + timeout
+
+
 class KlippyWebsocket(threading.Thread):
     _req_id = 0
     connected = False
-    callback_table = {}
-    reconnect_timeout = None
     reconnect_count = 0
+    # Oldest requests are dropped when there are more unanswered requests than this
+    max_pending = 500
+    reconnect_interval = 6
     max_retries = 4
 
     def __init__(self, screen, callback, host, port):
-        threading.Thread.__init__(self)
-        self._wst = None
+        threading.Thread.__init__(self, daemon=True)
         self.ws_url = None
         self._screen = screen
         self._callback = callback
         self.klippy = MoonrakerApi(self)
+        self.callback_table = {}
+        self._table_lock = threading.Lock()
+        self._expire_source = None
+        self.request_stats = {}
         self.closing = False
         self.ws = None
+        # Used to interrupt the wait between reconnection attempts
+        self._wake = threading.Event()
+        # Everything that has to run in the GTK thread goes through this queue
+        self._queue = SimpleQueue()
+        self._queue_lock = threading.Lock()
+        self._dispatch_source = None
+        # Window in milliseconds used to coalesce notify_status_update messages, 0 disables it
+        self.status_interval = max(0, screen._config.get_main_config().getint("status_update_interval", 50))
+        self._status_lock = threading.Lock()
+        self._status_buffer = {}
+        self._status_flush = None
 
         self.host = host
         self.port = port
@@ -59,11 +94,28 @@ class KlippyWebsocket(threading.Thread):
         return "ws"
 
     def initial_connect(self):
-        # Enable a timeout so that way if moonraker is not running, it will attempt to reconnect
         self.reconnect_count = 0
-        if not self.reconnect_timeout:
-            self.reconnect_timeout = GLib.timeout_add_seconds(6, self.reconnect)
-        self.connect()
+        if self.is_alive():
+            # The connection thread is waiting, retry now
+            self._wake.set()
+            return
+        logging.debug("Starting websocket thread")
+        self.start()
+
+    def run(self):
+        while not self.closing:
+            if self.reconnect_count > self.max_retries:
+                logging.debug("Stopping reconnections")
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if self.connect() is not False:
+                # Blocks until the connection is closed
+                self.ws.run_forever()
+            if not self.closing:
+                self._wake.wait(self.reconnect_interval)
+                self._wake.clear()
+        logging.debug("Websocket thread finished")
 
     def connect(self):
         def ws_on_close(ws, a=None, b=None):
@@ -79,161 +131,282 @@ class KlippyWebsocket(threading.Thread):
             self.on_open(ws)
 
         self.reconnect_count += 1
+        logging.debug(f"Attempting to connect #{self.reconnect_count}")
         try:
             state = self._screen.apiclient.get_server_info()
             if state is False:
                 if self.reconnect_count > self.max_retries:
-                    self._screen.panels['splash_screen'].add_retry_button()
-                    self._screen.panels['splash_screen'].update_text(
-                        _("Cannot connect to Moonraker")
-                        + f'\n\n{self._url}')
+                    self._post(self._screen.panels['splash_screen'].add_retry_button)
+                    self._post(self._screen.panels['splash_screen'].update_text,
+                               _("Cannot connect to Moonraker") + f'\n\n{self._url}')
                 elif self.reconnect_count > 2:
-                    self._screen.panels['splash_screen'].update_text(
-                        _("Cannot connect to Moonraker")
-                        + f'\n\n{self._url}\n\n'
-                        + _("Retrying") + f' #{self.reconnect_count}'
-                    )
+                    self._post(self._screen.panels['splash_screen'].update_text,
+                               _("Cannot connect to Moonraker")
+                               + f'\n\n{self._url}\n\n'
+                               + _("Retrying") + f' #{self.reconnect_count}')
                 return False
             token = self._screen.apiclient.get_oneshot_token()
         except Exception as e:
             logging.critical(e, exc_info=True)
             logging.debug("Unable to get oneshot token")
             return False
+        if self.closing:
+            return False
 
         self.ws_url = f"{self.ws_proto}://{self._url}/websocket?token={token}"
         self.ws = websocket.WebSocketApp(
             self.ws_url, on_close=ws_on_close, on_error=ws_on_error, on_message=ws_on_message, on_open=ws_on_open)
-
-        self._wst = threading.Thread(target=self.ws.run_forever, daemon=True)
-        try:
-            logging.debug("Starting websocket thread")
-            self._wst.start()
-        except Exception as e:
-            logging.critical(e, exc_info=True)
-            logging.debug("Error starting web socket")
+        return True
 
     def close(self):
         self.closing = True
+        self._wake.set()
         if self.ws is not None:
             self.ws.close()
 
     def is_connected(self):
         return self.connected
 
+    def _post(self, callback, *args):
+        with self._queue_lock:
+            self._queue.put((callback, args))
+            if self._dispatch_source is None:
+                self._dispatch_source = Gdk.threads_add_idle(GLib.PRIORITY_HIGH_IDLE, self._dispatch)
+
+    def _dispatch(self):
+        with self._queue_lock:
+            self._dispatch_source = None
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                logging.exception(f"Error running websocket callback {callback}:\n{e}")
+        return False
+
     def on_message(self, ws, message):
         response = json.loads(message)
-        if "id" in response and response['id'] in self.callback_table:
-            Gdk.threads_add_idle(
-                GLib.PRIORITY_HIGH_IDLE,
-                self.callback_table[response['id']][0],
-                response,
-                self.callback_table[response['id']][1],
-                self.callback_table[response['id']][2],
-                *self.callback_table[response['id']][3]
-            )
-            self.callback_table.pop(response['id'])
+        if self.status_interval > 0 and response.get("method") == "notify_status_update":
+            self._buffer_status(response['params'][0])
+            return
+        # Anything pending must be delivered first to keep the ordering with this message
+        self._flush_status()
+
+        if "id" in response:
+            with self._table_lock:
+                request = self.callback_table.pop(response['id'], None)
+                if request is not None:
+                    self._add_request_stat(request.method, time.monotonic() - request.sent)
+            if request is None:
+                return
+            if request.future is not None:
+                if request.future.set_running_or_notify_cancel():
+                    if "error" in response:
+                        request.future.set_exception(RequestError(response['error'].get('message', response['error'])))
+                    else:
+                        request.future.set_result(response.get('result'))
+            else:
+                self._post(request.callback, response, request.method, request.params, *request.args)
             return
 
         if "method" in response and "on_message" in self._callback:
-            Gdk.threads_add_idle(
-                GLib.PRIORITY_HIGH_IDLE,
+            self._post(
                 self._callback['on_message'],
                 response['method'],
                 response['params'][0] if "params" in response else {}
             )
         return
 
-    def send_method(self, method, params=None, callback=None, *args):
+    def _buffer_status(self, status):
+        with self._status_lock:
+            for obj, fields in status.items():
+                if obj in self._status_buffer:
+                    self._status_buffer[obj].update(fields)
+                else:
+                    self._status_buffer[obj] = dict(fields)
+            if self._status_flush is None:
+                self._status_flush = GLib.timeout_add(self.status_interval, self._status_timeout)
+
+    def _status_timeout(self):
+        with self._status_lock:
+            self._status_flush = None
+        self._flush_status()
+        # Already in the GTK thread, deliver without waiting for another wakeup
+        self._dispatch()
+        return False
+
+    def _flush_status(self):
+        with self._status_lock:
+            if not self._status_buffer:
+                return
+            status = self._status_buffer
+            self._status_buffer = {}
+        if "on_message" in self._callback:
+            self._post(self._callback['on_message'], "notify_status_update", status)
+
+    def send_method(self, method, params=None, callback=None, *args, timeout=None, future=False):
+        """
+        The callback runs in the GTK thread with the response, the method, the params and args.
+        With future=True a concurrent.futures.Future is returned instead of a boolean, it is resolved
+        in the websocket thread with the result or fails with RequestError.
+        Unanswered requests fail after timeout seconds, when the connection is lost, or when there are more than
+        max_pending, the callback then gets a response with an error like the ones sent by moonraker.
+        """
         if params is None:
             params = {}
         if self.is_connected() is False:
+            if future:
+                fut = Future()
+                fut.set_exception(RequestError(f"Not connected, {method} not sent"))
+                return fut
             return False
 
+        fut = Future() if future else None
         self._req_id += 1
-        if callback is not None:
-            self.callback_table[self._req_id] = [callback, method, params, [*args]]
+        req_id = self._req_id
+        if callback is not None or fut is not None:
+            with self._table_lock:
+                self.callback_table[req_id] = PendingRequest(method, params, callback, args, fut, timeout)
+                while len(self.callback_table) > self.max_pending:
+                    dropped = self.callback_table.pop(next(iter(self.callback_table)))
+                    logging.info(f"Too many pending requests, dropping {dropped.method}")
+                    self._fail_request(dropped, "Too many pending requests")
+                if timeout is not None and self._expire_source is None:
+                    self._expire_source = GLib.timeout_add_seconds(1, self._expire_requests)
+            if fut is not None:
+                fut.add_done_callback(lambda f: self._forget_request(req_id, f))
 
         data = {
             "jsonrpc": "2.0",
             "method": method,
             "params": params,
-            "id": self._req_id
+            "id": req_id
         }
         self.ws.send(json.dumps(data))
-        return True
+        return fut if future else True
+
+    def _forget_request(self, req_id, future):
+        if future.cancelled():
+            with self._table_lock:
+                self.callback_table.pop(req_id, None)
+
+    def _fail_request(self, request, reason):
+        if request.future is not None:
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(RequestError(f"{request.method}: {reason}"))
+        elif request.callback is not None:
+            response = {"error": {"code": 408, "message": f"{request.method}: {reason}"}}
+            self._post(request.callback, response, request.method, request.params, *request.args)
+
+    def _expire_requests(self):
+        now = time.monotonic()
+        with self._table_lock:
+            expired = [req_id for req_id, request in self.callback_table.items()
+                       if request.deadline is not None and request.deadline <= now]
+            expired = [self.callback_table.pop(req_id) for req_id in expired]
+            keep_running = any(request.deadline is not None for request in self.callback_table.values())
+            if not keep_running:
+                self._expire_source = None
+        for request in expired:
+            logging.info(f"Request timed out: {request.method}")
+            self._fail_request(request, "Timed out")
+        return keep_running
+
+    def _purge_requests(self, reason):
+        with self._table_lock:
+            pending = list(self.callback_table.values())
+            self.callback_table.clear()
+            if self._expire_source is not None:
+                GLib.source_remove(self._expire_source)
+                self._expire_source = None
+        if pending:
+            logging.info(f"Dropping {len(pending)} pending requests: {reason}")
+        for request in pending:
+            self._fail_request(request, reason)
+
+    def _add_request_stat(self, method, latency):
+        if method not in self.request_stats:
+            self.request_stats[method] = {"count": 0, "total": 0, "max": 0}
+        stat = self.request_stats[method]
+        stat['count'] += 1
+        stat['total'] += latency
+        stat['max'] = max(stat['max'], latency)
+
+    def get_pending_count(self):
+        return len(self.callback_table)
+
+    def get_request_stats(self):
+        with self._table_lock:
+            return {
+                method: {
+                    "count": stat['count'],
+                    "avg": stat['total'] / stat['count'],
+                    "max": stat['max']
+                } for method, stat in self.request_stats.items()
+            }
 
     def on_open(self, ws):
         logging.info("Moonraker Websocket Open")
-        logging.info(f"Self.connected = {self.is_connected()}")
         self.connected = True
         self.reconnect_count = 0
-        self._screen.panels['splash_screen'].remove_retry_button()
-        if self.reconnect_timeout is not None:
-            GLib.source_remove(self.reconnect_timeout)
-            self.reconnect_timeout = None
+        self._post(self._screen.panels['splash_screen'].remove_retry_button)
         if "on_connect" in self._callback:
-            Gdk.threads_add_idle(
-                GLib.PRIORITY_HIGH_IDLE,
-                self._callback['on_connect']
-            )
+            self._post(self._callback['on_connect'])
 
     def on_close(self, ws):
         if self.is_connected() is False:
             logging.debug("Connection already closed")
-            if self.reconnect_timeout is not None:
-                GLib.source_remove(self.reconnect_timeout)
-                self.reconnect_timeout = None
             return
 
+        self.connected = False
+        with self._status_lock:
+            self._status_buffer = {}
+        self._purge_requests("Connection closed")
         if self.closing is True:
             logging.debug("Closing websocket")
-            self.ws.keep_running = False
-            self.close()
-            self.closing = False
             return
 
         logging.info("Moonraker Websocket Closed")
-        self.connected = False
-        if self.reconnect_timeout is None:
-            self.reconnect_timeout = GLib.timeout_add_seconds(9, self.reconnect)
-
         if "on_close" in self._callback:
-            Gdk.threads_add_idle(
-                GLib.PRIORITY_HIGH_IDLE,
+            self._post(
                 self._callback['on_close'],
                 "Lost Connection to Moonraker",
                 True
             )
 
-    def reconnect(self):
-        if self.is_connected():
-            logging.debug("Reconnected")
-            return False
-        if self.reconnect_count > self.max_retries:
-            logging.debug("Stopping reconnections")
-            return False
-        logging.debug("Attempting to reconnect")
-        self.connect()
-        return True
-
     @staticmethod
     def on_error(ws, error):
         logging.debug(f"Websocket error: {error}")
 
 
 class MoonrakerApi:
-    def __init__(self, ws):
+    def __init__(self, ws, timeout=None, future=False):
         self._ws = ws
+        self._timeout = timeout
+        self._future = future
+
+    def options(self, timeout=None, future=False):
+        """
+        Returns the same api with a timeout in seconds for the requests,
+        with future=True the methods return a concurrent.futures.Future
+        """
+        return MoonrakerApi(self._ws, timeout, future)
+
+    def _send(self, method, params=None, callback=None, *args):
+        return self._ws.send_method(method, params, callback, *args, timeout=self._timeout, future=self._future)
 
     def emergency_stop(self):
         logging.info("Sending printer.emergency_stop")
-        return self._ws.send_method(
+        return self._send(
             "printer.emergency_stop"
         )
 
     def gcode_script(self, script, callback=None, *args):
         logging.debug(f"Sending printer.gcode.script: {script}")
-        return self._ws.send_method(
+        return self._send(
             "printer.gcode.script",
             {"script": script},
             callback,
@@ -242,7 +415,7 @@ class MoonrakerApi:
 
     def get_file_dir(self, path='gcodes', callback=None, *args):
         logging.debug("Sending server.files.directory")
-        return self._ws.send_method(
+        return self._send(
             "server.files.list",
             {"path": path},
             callback,
@@ -251,7 +424,7 @@ class MoonrakerApi:
 
     def get_file_list(self, callback=None, *args):
         logging.debug("Sending server.files.list")
-        return self._ws.send_method(
+        return self._send(
             "server.files.list",
             {},
             callback,
@@ -259,23 +432,25 @@ class MoonrakerApi:
         )
 
     def get_file_metadata(self, filename, callback=None, *args):
-        return self._ws.send_method(
+        return self._send(
             "server.files.metadata",
             {"filename": filename},
             callback,
             *args
         )
 
-    def object_subscription(self, updates):
+    def object_subscription(self, updates, callback=None, *args):
         logging.debug(f"Sending printer.objects.subscribe: {updates}")
-        return self._ws.send_method(
+        return self._send(
             "printer.objects.subscribe",
-            updates
+            updates,
+            callback,
+            *args
         )
 
     def power_device_off(self, device, callback=None, *args):
         logging.debug(f"Sending machine.device_power.off: {device}")
-        return self._ws.send_method(
+        return self._send(
             "machine.device_power.off",
             {device: False},
             callback,
@@ -284,7 +459,7 @@ class MoonrakerApi:
 
     def power_device_on(self, device, callback=None, *args):
         logging.debug("Sending machine.device_power.on {device}")
-        return self._ws.send_method(
+        return self._send(
             "machine.device_power.on",
             {device: False},
             callback,
@@ -293,7 +468,7 @@ class MoonrakerApi:
 
     def print_cancel(self, callback=None, *args):
         logging.debug("Sending printer.print.cancel")
-        return self._ws.send_method(
+        return self._send(
             "printer.print.cancel",
             {},
             callback,
@@ -302,7 +477,7 @@ class MoonrakerApi:
 
     def print_pause(self, callback=None, *args):
         logging.debug("Sending printer.print.pause")
-        return self._ws.send_method(
+        return self._send(
             "printer.print.pause",
             {},
             callback,
@@ -311,7 +486,7 @@ class MoonrakerApi:
 
     def print_resume(self, callback=None, *args):
         logging.debug("Sending printer.print.resume")
-        return self._ws.send_method(
+        return self._send(
             "printer.print.resume",
             {},
             callback,
@@ -320,7 +495,7 @@ class MoonrakerApi:
 
     def print_start(self, filename, callback=None, *args):
         logging.debug("Sending printer.print.start")
-        return self._ws.send_method(
+        return self._send(
             "printer.print.start",
             {
                 "filename": filename
@@ -332,7 +507,7 @@ class MoonrakerApi:
     def temperature_set(self, heater, target, callback=None, *args):
         if heater == "heater_bed":
             logging.debug(f"Sending printer.gcode.script: {KlippyGcodes.set_bed_temp(target)}")
-            return self._ws.send_method(
+            return self._send(
                 "printer.gcode.script",
                 {
                     "script": KlippyGcodes.set_bed_temp(target)
@@ -344,7 +519,7 @@ class MoonrakerApi:
             logging.debug(
                 f'Sending printer.gcode.script: {KlippyGcodes.set_ext_temp(target, heater.replace("tool", ""))}')
             # TODO: Add max/min limits
-            return self._ws.send_method(
+            return self._send(
                 "printer.gcode.script",
                 {
                     "script": KlippyGcodes.set_ext_temp(target, heater.replace("tool", ""))
@@ -355,7 +530,7 @@ class MoonrakerApi:
 
     def set_bed_temp(self, target, callback=None, *args):
         logging.debug(f"Sending set_bed_temp: {KlippyGcodes.set_bed_temp(target)}")
-        return self._ws.send_method(
+        return self._send(
             "printer.gcode.script",
             {
                 "script": KlippyGcodes.set_bed_temp(target)
@@ -366,7 +541,7 @@ class MoonrakerApi:
 
     def set_heater_temp(self, heater, target, callback=None, *args):
         logging.debug(f"Sending heater {heater} to temp: {target}")
-        return self._ws.send_method(
+        return self._send(
             "printer.gcode.script",
             {
                 "script": KlippyGcodes.set_heater_temp(heater, target)
@@ -377,7 +552,7 @@ class MoonrakerApi:
 
     def set_temp_fan_temp(self, temp_fan, target, callback=None, *args):
         logging.debug(f"Sending temperature fan {temp_fan} to temp: {target}")
-        return self._ws.send_method(
+        return self._send(
             "printer.gcode.script",
             {
                 "script": KlippyGcodes.set_temp_fan_temp(temp_fan, target)
@@ -388,7 +563,7 @@ class MoonrakerApi:
 
     def set_tool_temp(self, tool, target, callback=None, *args):
         logging.debug(f"Sending set_tool_temp: {KlippyGcodes.set_ext_temp(target, tool)}")
-        return self._ws.send_method(
+        return self._send(
             "printer.gcode.script",
             {
                 "script": KlippyGcodes.set_ext_temp(target, tool)
@@ -399,12 +574,12 @@ class MoonrakerApi:
 
     def restart(self):
         logging.debug("Sending printer.restart")
-        return self._ws.send_method(
+        return self._send(
             "printer.restart"
         )
 
     def restart_firmware(self):
         logging.debug("Sending printer.firmware_restart")
-        return self._ws.send_method(
+        return self._send(
             "printer.firmware_restart"
         )
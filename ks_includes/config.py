@@ -147,11 +147,12 @@ class KlipperScreenConfig:
                 )
                 strs = (
                     'default_printer', 'language', 'print_sort_dir', 'theme', 'screen_blanking', 'font_size',
-                    'print_estimate_method', 'screen_blanking'
+                    'print_estimate_method', 'screen_blanking', 'warmup_panels'
                 )
                 numbers = (
                     'job_complete_timeout', 'job_error_timeout', 'move_speed_xy', 'move_speed_z',
-                    'print_estimate_compensation', 'width', 'height',
+                    'print_estimate_compensation', 'width', 'height', 'status_update_interval',
+                    'temperature_history', 'panel_cache_size',
                 )
             elif section.startswith('printer '):
                 bools = (
@@ -397,6 +398,14 @@ class KlipperScreenConfig:
         # fallback
         return self.default_config_path
 
+    def get_cache_path(self, name):
+        # Hidden file next to the user config, or in the home directory when using the defaults
+        if self.config_path != self.default_config_path:
+            directory = os.path.dirname(self.config_path)
+        else:
+            directory = os.path.expanduser("~/")
+        return os.path.join(directory, f".KlipperScreen-{name}")
+
     def get_config(self):
         return self.config
 
@@ -0,0 +1,51 @@
+import logging
+
+
+class EventBus:
+    """
+    Delivers events to the callbacks subscribed to their topic, in the order they subscribed.
+    Topics used by the screen: the moonraker notification ("notify_gcode_response"),
+    "status:<object>" with the changed fields of a printer object and "file:<action>" for the file list
+    """
+
+    def __init__(self):
+        # Tuples are replaced rather than modified, so callbacks can subscribe and unsubscribe while delivering
+        self.subscribers = {}
+        self.owners = {}
+        # Number of topics subscribed per prefix, so publishers can skip building topics nobody listens to
+        self.status_topics = 0
+        self.file_topics = 0
+
+    def subscribe(self, topic, callback, condition=None, owner=None):
+        """callback(topic, data) runs for each event of the topic, if condition(data) is True when set"""
+        if topic not in self.subscribers:
+            self._count_topic(topic, 1)
+        self.subscribers[topic] = self.subscribers.get(topic, ()) + ((callback, condition, owner),)
+        if owner is not None:
+            self.owners.setdefault(owner, set()).add(topic)
+
+    def unsubscribe(self, owner):
+        for topic in self.owners.pop(owner, ()):
+            subscribers = tuple(s for s in self.subscribers.get(topic, ()) if s[2] != owner)
+            if subscribers:
+                self.subscribers[topic] = subscribers
+            elif self.subscribers.pop(topic, None) is not None:
+                self._count_topic(topic, -1)
+
+    def _count_topic(self, topic, count):
+        if topic.startswith("status:"):
+            self.status_topics += count
+        elif topic.startswith("file:"):
+            self.file_topics += count
+
+    def has_subscribers(self, topic):
+        return topic in self.subscribers
+
+    def publish(self, topic, data):
+        for callback, condition, owner in self.subscribers.get(topic, ()):
+            if condition is not None and not condition(data):
+                continue
+            try:
+                callback(topic, data)
+            except Exception as e:
+                logging.exception(f"Error delivering {topic} to {owner or callback}:\n{e}")
@@ -2,20 +2,41 @@ import logging
 import os
 
 import gi
+from collections import OrderedDict
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import GLib
 
+from ks_includes.KlippyWebsocket import RequestError
+from ks_includes.metadata_cache import MetadataCache
+
 
 class KlippyFiles:
+    # Metadata is fetched on demand, with a limited number of requests in flight
+    max_metadata_requests = 4
+    metadata_timeout = 10
+
     def __init__(self, screen):
         self._screen = screen
         self.callbacks = []
+        # Catalog of the files keyed by path, and the directory tree starting at "gcodes"
         self.files = {}
-        self.filelist = []
+        self.directories = {"gcodes": {"directories": set(), "files": set(), "modified": 0}}
         self.gcodes_path = None
+        self.metadata_queue = OrderedDict()
+        self.metadata_requests = set()
+        self.metadata_loaded = set()
+        # Files whose metadata request failed, they aren't requested again until they change or the list is reloaded
+        self.metadata_failed = set()
+        self.prefetch_files = set()
+        self.metadata_cache = None
+        self.cached_metadata = {}
 
     def initialize(self):
+        if self.metadata_cache is None:
+            self.metadata_cache = MetadataCache(self._screen._config.get_cache_path("metadata.db"),
+                                                self._screen.connected_printer)
+            self.cached_metadata = self.metadata_cache.load()
         self.gcodes_path = None
         if "virtual_sdcard" in self._screen.printer.get_config_section_list():
             vsd = self._screen.printer.get_config_section("virtual_sdcard")
@@ -24,27 +45,33 @@ class KlippyFiles:
         logging.info(f"Gcodes path: {self.gcodes_path}")
 
     def reset(self):
+        if self.metadata_cache is not None:
+            self.metadata_cache.close()
         self.__init__(self._screen)
 
     def _callback(self, result, method, params):
         if method == "server.files.list":
             if "result" in result and isinstance(result['result'], list):
-                newfiles = []
-                deletedfiles = self.filelist.copy()
-                for item in result['result']:
-                    file = item['filename'] if "filename" in item else item['path']
-                    if file in self.files:
-                        deletedfiles.remove(file)
-                    else:
-                        newfiles.append(file)
-                        self.add_file(item, False)
-
-                if newfiles or len(deletedfiles) > 0:
-                    self.run_callbacks(newfiles, deletedfiles)
-
-                if len(deletedfiles) > 0:
-                    for file in deletedfiles:
-                        self.remove_file(file)
+                # The list is refreshed after (re)connecting, failed requests are worth another try
+                self.metadata_failed.clear()
+                newfiles, deletedfiles, modfiles = self.diff_file_list(result['result'])
+                for file in newfiles:
+                    self.add_file(newfiles[file], False)
+                for file in deletedfiles:
+                    self.remove_file(file, False)
+                for file in modfiles:
+                    self.files[file].update({"size": modfiles[file]['size'], "modified": modfiles[file]['modified']})
+                    self._add_to_tree(file, modfiles[file]['modified'])
+                    self.refresh_metadata(file)
+
+                if self.metadata_cache is not None:
+                    # Files deleted while KlipperScreen was not running
+                    removed = [file for file in self.cached_metadata if file not in self.files]
+                    self.metadata_cache.remove(removed)
+                    self.cached_metadata = {}
+
+                if newfiles or deletedfiles or modfiles:
+                    self.run_callbacks(list(newfiles), deletedfiles, list(modfiles))
         elif method == "server.files.directory":
             if "result" in result:
                 directory = params['path'][7:] if params['path'].startswith('gcodes/') else params['path']
@@ -54,34 +81,64 @@ class KlippyFiles:
                 newfiles = []
                 for file in result['result']['files']:
                     fullpath = f"{directory}/{file['filename']}"
-                    if fullpath not in self.filelist:
+                    if fullpath not in self.files:
+                        self.add_file({"path": fullpath, "size": file['size'], "modified": file['modified']}, False)
                         newfiles.append(fullpath)
 
                 if newfiles:
                     self.run_callbacks(newfiles)
         elif method == "server.files.metadata":
             if "error" in result.keys():
-                logging.debug(f"Error in getting metadata for {params['filename']}. Retrying in 6 seconds")
+                logging.debug(f"Error in getting metadata for {params['filename']}")
                 return
+            self.set_metadata(params['filename'], result['result'])
+
+    def set_metadata(self, filename, metadata, notify=True):
+        if filename not in self.files:
+            return
+        if notify and self.metadata_cache is not None:
+            self.metadata_cache.store(filename, metadata.get('size', self.files[filename]['size']),
+                                      metadata.get('modified', self.files[filename]['modified']), metadata)
+        self.files[filename].update(metadata)
+        self.metadata_loaded.add(filename)
+        if "thumbnails" in self.files[filename]:
+            self.files[filename]['thumbnails'].sort(key=lambda y: y['size'], reverse=True)
+
+            for thumbnail in self.files[filename]['thumbnails']:
+                thumbnail['local'] = False
+                if self.gcodes_path is not None:
+                    fpath = os.path.join(self.gcodes_path, filename)
+                    fdir = os.path.dirname(fpath)
+                    path = os.path.join(fdir, thumbnail['relative_path'])
+                    if os.access(path, os.R_OK):
+                        thumbnail['local'] = True
+                        thumbnail['path'] = path
+                if thumbnail['local'] is False:
+                    fdir = os.path.dirname(filename)
+                    thumbnail['path'] = os.path.join(fdir, thumbnail['relative_path'])
+        if filename in self.prefetch_files:
+            self.prefetch_files.discard(filename)
+            self.prefetch_thumbnails(filename)
+        if notify:
+            self.run_callbacks(mods=[filename])
+
+    def prefetch(self, filename):
+        # New uploads are usually printed right away, load what the print dialog needs
+        if filename not in self.files:
+            return
+        self.prefetch_files.add(filename)
+        self.request_metadata(filename, priority=True)
+
+    def prefetch_thumbnails(self, filename):
+        thumbnails = self._screen.thumbnails
+        if thumbnails is None or not self.has_thumbnail(filename):
+            return
+        for width, height in ((self._screen.gtk.img_width, self._screen.gtk.img_height), thumbnails.dialog_size()):
+            thumbnails.get_async(filename, width, height, self._thumbnail_prefetched, filename)
 
-            for x in result['result']:
-                self.files[params['filename']][x] = result['result'][x]
-            if "thumbnails" in self.files[params['filename']]:
-                self.files[params['filename']]['thumbnails'].sort(key=lambda y: y['size'], reverse=True)
-
-                for thumbnail in self.files[params['filename']]['thumbnails']:
-                    thumbnail['local'] = False
-                    if self.gcodes_path is not None:
-                        fpath = os.path.join(self.gcodes_path, params['filename'])
-                        fdir = os.path.dirname(fpath)
-                        path = os.path.join(fdir, thumbnail['relative_path'])
-                        if os.access(path, os.R_OK):
-                            thumbnail['local'] = True
-                            thumbnail['path'] = path
-                    if thumbnail['local'] is False:
-                        fdir = os.path.dirname(params['filename'])
-                        thumbnail['path'] = os.path.join(fdir, thumbnail['relative_path'])
-            self.run_callbacks(mods=[params['filename']])
+    @staticmethod
+    def _thumbnail_prefetched(pixbuf, filename):
+        logging.debug(f"Thumbnail loaded for {filename}")
 
     def add_file(self, item, notify=True):
         if 'filename' not in item and 'path' not in item:
@@ -89,21 +146,67 @@ class KlippyFiles:
             return
 
         filename = item['path'] if "path" in item else item['filename']
-        if filename in self.filelist:
+        if filename in self.files:
             logging.info(f"File already exists: {filename}")
-            self.request_metadata(filename)
+            self.refresh_metadata(filename)
             GLib.timeout_add_seconds(1, self.run_callbacks, mods=[filename])
             return
 
-        self.filelist.append(filename)
         self.files[filename] = {
             "size": item['size'],
             "modified": item['modified']
         }
-        self.request_metadata(filename)
+        self._add_to_tree(filename, item['modified'])
+        if filename in self.cached_metadata:
+            size, modified, metadata = self.cached_metadata.pop(filename)
+            # Only valid if the file didn't change since it was stored
+            if size == item['size'] and modified == item['modified']:
+                self.set_metadata(filename, metadata, False)
         if notify is True:
             self.run_callbacks(newfiles=[filename])
 
+    def _add_to_tree(self, filename, modified):
+        parts = f"gcodes/{filename}".split('/')
+        directory = "gcodes"
+        for part in parts[1:-1]:
+            subdir = f"{directory}/{part}"
+            if subdir not in self.directories:
+                self.directories[subdir] = {"directories": set(), "files": set(), "modified": 0}
+                self.directories[directory]['directories'].add(subdir)
+            directory = subdir
+            self.directories[directory]['modified'] = max(self.directories[directory]['modified'], modified)
+        self.directories[directory]['files'].add(parts[-1])
+
+    def _remove_from_tree(self, filename):
+        parts = f"gcodes/{filename}".split('/')
+        directory = '/'.join(parts[:-1])
+        if directory not in self.directories:
+            return
+        self.directories[directory]['files'].discard(parts[-1])
+        # Empty directories are dropped, they are not listed by moonraker either
+        while directory != "gcodes" and not self.directories[directory]['files'] \
+                and not self.directories[directory]['directories']:
+            del self.directories[directory]
+            parent = directory.rsplit('/', 1)[0]
+            self.directories[parent]['directories'].discard(directory)
+            directory = parent
+
+    def diff_file_list(self, items):
+        """
+        Compares a full listing with the catalog
+        returns the new and modified items keyed by path and the list of deleted paths
+        """
+        listing = {item['path'] if "path" in item else item['filename']: item for item in items}
+        newfiles = {}
+        modfiles = {}
+        for file, item in listing.items():
+            if file not in self.files:
+                newfiles[file] = item
+            elif item['modified'] != self.files[file]['modified']:
+                modfiles[file] = item
+        deletedfiles = [file for file in self.files if file not in listing]
+        return newfiles, deletedfiles, modfiles
+
     def add_file_callback(self, callback):
         try:
             self.callbacks.append(callback)
@@ -118,10 +221,16 @@ class KlippyFiles:
             self._screen._ws.klippy.get_file_dir(f"gcodes/{data['item']['path']}", self._callback)
         elif data['action'] == "create_file":
             self.add_file(data['item'])
+            self.prefetch(data['item']['path'])
         elif data['action'] == "delete_file":
             self.remove_file(data['item']['path'])
         elif data['action'] == "modify_file":
-            self.request_metadata(data['item']['path'])
+            if data['item']['path'] in self.files:
+                self.files[data['item']['path']].update({"size": data['item']['size'],
+                                                         "modified": data['item']['modified']})
+            self.metadata_loaded.discard(data['item']['path'])
+            self.metadata_failed.discard(data['item']['path'])
+            self.prefetch(data['item']['path'])
         elif data['action'] == "move_file":
             self.add_file(data['item'], False)
             self.remove_file(data['source_item']['path'], False)
@@ -132,7 +241,7 @@ class KlippyFiles:
             self.callbacks.pop(self.callbacks.index(callback))
 
     def file_exists(self, filename):
-        return filename in self.filelist
+        return filename in self.files
 
     def file_metadata_exists(self, filename):
         if self.file_exists(filename):
@@ -149,25 +258,94 @@ class KlippyFiles:
             return ['http', thumb['path']]
         return ['file', thumb['path']]
 
+    def get_thumbnail(self, filename, width, height):
+        # The smallest thumbnail that covers the size, or the largest one available
+        if not self.has_thumbnail(filename) or not self.files[filename]['thumbnails']:
+            return None
+        thumbnails = self.files[filename]['thumbnails']
+        covering = [t for t in thumbnails if t['width'] >= width and t['height'] >= height]
+        if covering:
+            return min(covering, key=lambda t: t['width'] * t['height'])
+        return max(thumbnails, key=lambda t: t['width'] * t['height'])
+
     def has_thumbnail(self, filename):
         if filename not in self.files:
             return False
         return "thumbnails" in self.files[filename] and len(self.files[filename]) > 0
 
-    def request_metadata(self, filename):
-        if filename not in self.filelist:
+    def has_metadata(self, filename):
+        return filename in self.metadata_loaded
+
+    def has_metadata_failed(self, filename):
+        return filename in self.metadata_failed
+
+    def is_metadata_pending(self, filename):
+        return filename in self.metadata_queue or filename in self.metadata_requests
+
+    def request_metadata(self, filename, priority=False):
+        if filename not in self.files:
             return False
-        self._screen._ws.klippy.get_file_metadata(filename, self._callback)
+        if filename in self.metadata_requests:
+            return True
+        self.metadata_queue[filename] = True
+        if priority:
+            self.metadata_queue.move_to_end(filename, last=False)
+        self._send_metadata_requests()
+        return True
+
+    def refresh_metadata(self, filename):
+        # Metadata that was already loaded is outdated, the rest is requested when needed
+        self.metadata_failed.discard(filename)
+        if filename in self.metadata_loaded:
+            self.metadata_loaded.discard(filename)
+            self.request_metadata(filename)
+
+    def cancel_metadata(self, directory=None):
+        # Drops the queued requests of the files in the directory ("gcodes/sub/dir"), or all of them
+        if directory is None:
+            self.metadata_queue.clear()
+            return
+        for filename in [f for f in self.metadata_queue if f"gcodes/{f}".rsplit('/', 1)[0] == directory]:
+            del self.metadata_queue[filename]
+
+    def _send_metadata_requests(self):
+        while self.metadata_queue and len(self.metadata_requests) < self.max_metadata_requests:
+            filename, _prio = self.metadata_queue.popitem(last=False)
+            if filename not in self.files:
+                continue
+            self.metadata_requests.add(filename)
+            future = self._screen._ws.klippy.options(self.metadata_timeout, True).get_file_metadata(filename)
+            future.add_done_callback(lambda f, name=filename: GLib.idle_add(self._metadata_done, name, f))
+
+    def _metadata_done(self, filename, future):
+        self.metadata_requests.discard(filename)
+        try:
+            self.set_metadata(filename, future.result())
+        except RequestError as e:
+            self.metadata_failed.add(filename)
+            logging.debug(f"Error in getting metadata for {filename}: {e}")
+        except Exception as e:
+            logging.exception(f"Error in processing metadata for {filename}: {e}")
+        finally:
+            # The queue stops if the next requests aren't sent
+            self._send_metadata_requests()
+        return False
 
     def refresh_files(self):
         self._screen._ws.klippy.get_file_list(self._callback)
 
     def remove_file(self, filename, notify=True):
-        if filename not in self.filelist:
+        if filename not in self.files:
             return
 
-        self.filelist.remove(filename)
-        self.files.pop(filename, None)
+        self.files.pop(filename)
+        self._remove_from_tree(filename)
+        self.metadata_loaded.discard(filename)
+        self.metadata_failed.discard(filename)
+        self.metadata_queue.pop(filename, None)
+        self.prefetch_files.discard(filename)
+        if self.metadata_cache is not None:
+            self.metadata_cache.remove([filename])
 
         if notify is True:
             self.run_callbacks(deletedfiles=[filename])
@@ -190,7 +368,11 @@ class KlippyFiles:
         return False
 
     def get_file_list(self):
-        return self.filelist
+        return list(self.files)
+
+    def get_directory(self, directory):
+        # directory is relative to the root, "gcodes/sub/dir"
+        return self.directories.get(directory)
 
     def get_file_info(self, filename):
         if filename not in self.files:
@@ -129,7 +129,7 @@ class KlipperScreenLoggingHandler(logging.handlers.RotatingFileHandler):
         super(KlipperScreenLoggingHandler, self).__init__(filename, **kwargs)
         self.rollover_info = {
             'header': f"{'-' * 20}KlipperScreen Log Start{'-' * 20}",
-            'version': f"Git Version: {software_version}",
+            'version': f"Git Version: {software_version}" if software_version else "",
         }
         lines = [line for line in self.rollover_info.values() if line]
         if self.stream is not None:
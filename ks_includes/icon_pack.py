@@ -0,0 +1,126 @@
+import json
+import logging
+import mmap
+import os
+import struct
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf, GLib
+
+MAGIC = b"KSICONS1"
+HEADER = struct.Struct("<8sI")
+
+
+class IconPack:
+    """
+    Rasterized icons stored in one file that is memory-mapped at startup.
+    Layout: magic, length of the json index, json index, pixel data.
+    The pack is ignored when the key (theme, files, resolution and font size) doesn't match.
+    """
+    # Seconds to wait after a new icon is rasterized before writing the pack
+    save_delay = 30
+
+    def __init__(self, path, themedir, key):
+        self.path = path
+        self.themedir = themedir
+        self.key = key
+        self.icons = {}
+        self.data = None
+        self.data_start = 0
+        self.save_timeout = None
+        self.open()
+
+    def open(self):
+        try:
+            with open(self.path, "rb") as file:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, length = HEADER.unpack_from(self.data)
+            index = json.loads(self.data[HEADER.size:HEADER.size + length])
+            if magic != MAGIC or index['key'] != self.key:
+                logging.info("Icon pack is outdated")
+                self.close()
+                return
+            self.icons = index['icons']
+            self.data_start = HEADER.size + length
+            logging.info(f"Icon pack: {len(self.icons)} icons")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logging.error(f"Unable to read the icon pack {self.path}: {e}")
+            self.close()
+
+    @property
+    def valid(self):
+        return self.data is not None
+
+    @staticmethod
+    def entry_name(name, width, height):
+        return f"{name}|{width}|{height}"
+
+    def get(self, name, width, height):
+        entry = self.icons.get(self.entry_name(name, width, height))
+        if entry is None or self.data is None:
+            return None
+        offset, length, pwidth, pheight, rowstride, has_alpha = entry
+        start = self.data_start + offset
+        pixels = GLib.Bytes.new(self.data[start:start + length])
+        return GdkPixbuf.Pixbuf.new_from_bytes(pixels, GdkPixbuf.Colorspace.RGB, has_alpha, 8,
+                                               pwidth, pheight, rowstride)
+
+    def schedule_save(self, pixbufs):
+        if self.save_timeout is None:
+            self.save_timeout = GLib.timeout_add_seconds(self.save_delay, self.save, pixbufs)
+
+    def save(self, pixbufs):
+        """
+        Writes the icons of the pack and the ones in pixbufs {(themedir, name, width, height): pixbuf},
+        pixbufs is emptied once they are in the pack
+        """
+        self.save_timeout = None
+        entries = {}
+        for (themedir, name, width, height), pixbuf in list(pixbufs.items()):
+            if themedir == self.themedir and pixbuf is not None:
+                entries[self.entry_name(name, width, height)] = pixbuf
+        for entry in self.icons:
+            if entry not in entries:
+                name, width, height = entry.rsplit("|", 2)
+                pixbuf = self.get(name, int(width), int(height))
+                if pixbuf is not None:
+                    entries[entry] = pixbuf
+        icons = {}
+        blobs = []
+        offset = 0
+        for entry, pixbuf in entries.items():
+            pixels = pixbuf.get_pixels()
+            icons[entry] = [offset, len(pixels), pixbuf.get_width(), pixbuf.get_height(),
+                            pixbuf.get_rowstride(), pixbuf.get_has_alpha()]
+            blobs.append(pixels)
+            offset += len(pixels)
+        index = json.dumps({"key": self.key, "icons": icons}).encode()
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "wb") as file:
+                file.write(HEADER.pack(MAGIC, len(index)))
+                file.write(index)
+                for blob in blobs:
+                    file.write(blob)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.error(f"Unable to write the icon pack {self.path}: {e}")
+            return False
+        logging.info(f"Icon pack saved: {len(icons)} icons")
+        pixbufs.clear()
+        self.close()
+        self.open()
+        return False
+
+    def close(self):
+        if self.save_timeout is not None:
+            GLib.source_remove(self.save_timeout)
+            self.save_timeout = None
+        if self.data is not None:
+            self.data.close()
+        self.data = None
+        self.icons = {}
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import sqlite3
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+
+
+class MetadataCache:
+    # Seconds to group the writes before committing them to disk
+    commit_delay = 10
+
+    def __init__(self, path, printer):
+        self.path = path
+        self.printer = printer
+        self.commit_timeout = None
+        self.db = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.db = sqlite3.connect(path)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "printer TEXT, path TEXT, size INTEGER, modified REAL, data TEXT, "
+                "PRIMARY KEY (printer, path))"
+            )
+            self.db.commit()
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Unable to open the metadata cache {path}: {e}")
+            self.db = None
+
+    def load(self):
+        """Returns {path: (size, modified, metadata)} for the printer"""
+        if self.db is None:
+            return {}
+        try:
+            rows = self.db.execute(
+                "SELECT path, size, modified, data FROM metadata WHERE printer = ?", (self.printer,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Unable to read the metadata cache: {e}")
+            return {}
+        cache = {}
+        for path, size, modified, data in rows:
+            try:
+                cache[path] = (size, modified, json.loads(data))
+            except ValueError:
+                continue
+        logging.info(f"Metadata cache: {len(cache)} files")
+        return cache
+
+    def store(self, path, size, modified, metadata):
+        self._execute(
+            "INSERT OR REPLACE INTO metadata (printer, path, size, modified, data) VALUES (?, ?, ?, ?, ?)",
+            (self.printer, path, size, modified, json.dumps(metadata))
+        )
+
+    def remove(self, paths):
+        for path in paths:
+            self._execute("DELETE FROM metadata WHERE printer = ? AND path = ?", (self.printer, path))
+
+    def _execute(self, query, params):
+        if self.db is None:
+            return
+        try:
+            self.db.execute(query, params)
+        except sqlite3.Error as e:
+            logging.error(f"Unable to update the metadata cache: {e}")
+            return
+        if self.commit_timeout is None:
+            self.commit_timeout = GLib.timeout_add_seconds(self.commit_delay, self.commit)
+
+    def commit(self):
+        self.commit_timeout = None
+        if self.db is not None:
+            try:
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Unable to save the metadata cache: {e}")
+        return False
+
+    def close(self):
+        if self.commit_timeout is not None:
+            GLib.source_remove(self.commit_timeout)
+        self.commit()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
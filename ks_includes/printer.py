@@ -4,8 +4,13 @@ import logging
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gdk, GLib
 
+from ks_includes.ringbuffer import RingBuffer
+
 
 class Printer:
+    # Seconds of temperature history kept per device and series, sampled every second
+    temp_store_size = 1200
+
     def __init__(self, printer_info, data, state_execute_cb):
         self.klipper = {"version": printer_info['software_version']}
         self.tempstore = None
@@ -27,6 +32,15 @@ class Printer:
             "shutdown": None
         }
         self.tools = []
+        self.sections = set()
+        self.sections_by_type = {}
+        self.heaters = []
+        self.fans = []
+        self.filament_sensors = []
+        self.output_pins = []
+        self.status_devices = []
+        self.observers = {}
+        self.changes = set()
         self.extrudercount = 0
         self.tempdevcount = 0
         self.fancount = 0
@@ -42,6 +56,15 @@ class Printer:
         self.power_devices = None
         self.state_callbacks = None
         self.tools = None
+        self.sections = None
+        self.sections_by_type = None
+        self.heaters = None
+        self.fans = None
+        self.filament_sensors = None
+        self.output_pins = None
+        self.status_devices = None
+        self.observers = None
+        self.changes = None
         self.extrudercount = None
         self.tempdevcount = None
         self.fancount = None
@@ -114,6 +137,7 @@ class Printer:
                 r['max_y'] = float(r['max_y'])
                 r['min_y'] = float(r['min_y'])
                 r['points'] = [[float(j.strip()) for j in i.split(",")] for i in r['points'].strip().split("\n")]
+        self.build_section_index()
         self.process_update(data)
 
         logging.info(f"Klipper version: {self.klipper['version']}")
@@ -122,22 +146,87 @@ class Printer:
         logging.info(f"# Fans: {self.fancount}")
         logging.info(f"# Output pins: {self.output_pin_count}")
 
+    def build_section_index(self):
+        # Sections named "type name" are indexed by type so lookups don't need to scan the whole config
+        self.sections = set(self.config)
+        self.sections_by_type = {}
+        for section in self.config:
+            if " " in section:
+                section_type = section.split(" ", 1)[0]
+                if section_type not in self.sections_by_type:
+                    self.sections_by_type[section_type] = []
+                self.sections_by_type[section_type].append(section)
+
+        self.heaters = []
+        if self.has_heated_bed():
+            self.heaters.append("heater_bed")
+        for section_type in ("heater_generic", "temperature_sensor", "temperature_fan"):
+            self.heaters.extend(self.sections_by_type.get(section_type, []))
+        self.fans = ["fan"] if "fan" in self.sections else []
+        for section_type in ("controller_fan", "fan_generic", "heater_fan"):
+            self.fans.extend(self.sections_by_type.get(section_type, []))
+        self.filament_sensors = []
+        for section_type in ("filament_switch_sensor", "filament_motion_sensor"):
+            self.filament_sensors.extend(self.sections_by_type.get(section_type, []))
+        self.output_pins = list(self.sections_by_type.get("output_pin", []))
+        self.status_devices = self.tools + self.heaters + self.filament_sensors
+
     def process_update(self, data):
-        for x in (self.get_tools() + self.get_heaters() + self.get_filament_sensors()):
+        for x in self.status_devices:
             if x in data:
                 for i in data[x]:
                     self.set_dev_stat(x, i, data[x][i])
 
+        changes = set()
         for x in data:
             if x == "configfile":
                 continue
             if x not in self.data:
                 self.data[x] = {}
-            self.data[x].update(data[x])
+            current = self.data[x]
+            changes.update((x, field) for field, value in data[x].items()
+                           if field not in current or current[field] != value)
+            current.update(data[x])
+        self.changes = changes
+        if changes and self.observers:
+            self.notify_observers(changes)
 
         if "webhooks" in data or "print_stats" in data:
             self.process_status_update()
 
+    def add_observer(self, obj, callback, fields=None):
+        """
+        callback(obj, fields) runs once per update with the changed fields of obj,
+        if fields is set it only runs when one of those fields has changed
+        """
+        if obj not in self.observers:
+            self.observers[obj] = []
+        self.observers[obj].append((callback, None if fields is None else set(fields)))
+
+    def remove_observer(self, callback):
+        for obj in list(self.observers):
+            self.observers[obj] = [o for o in self.observers[obj] if o[0] != callback]
+            if not self.observers[obj]:
+                del self.observers[obj]
+
+    def notify_observers(self, changes):
+        changed = {}
+        for obj, field in changes:
+            if obj in self.observers:
+                if obj not in changed:
+                    changed[obj] = set()
+                changed[obj].add(field)
+        for obj, fields in changed.items():
+            for callback, watched in list(self.observers.get(obj, [])):
+                if watched is None or not watched.isdisjoint(fields):
+                    callback(obj, fields)
+
+    def has_changed(self, obj, field=None):
+        # Whether the last update changed the field, or any field of the object
+        if field is not None:
+            return (obj, field) in self.changes
+        return any(o == obj for o, f in self.changes)
+
     def get_updates(self):
         updates = self.data.copy()
         updates.update(self.devices)
@@ -188,9 +277,13 @@ class Printer:
         logging.debug(f"Power devices: {self.power_devices}")
 
     def get_config_section_list(self, search=""):
-        if self.config is not None:
-            return [i for i in list(self.config) if i.startswith(search)] if hasattr(self, "config") else []
-        return []
+        if self.config is None:
+            return []
+        if search == "":
+            return list(self.config)
+        if search[-1] == " " and search.count(" ") == 1:
+            return list(self.sections_by_type.get(search[:-1], []))
+        return [i for i in self.config if i.startswith(search)]
 
     def get_config_section(self, section):
         return self.config[section] if section in self.config else False
@@ -198,36 +291,21 @@ class Printer:
     def get_data(self):
         return self.data
 
+    # The getters return copies, the lists are built once per configuration and shared
     def get_fans(self):
-        fans = []
-        if self.config_section_exists("fan"):
-            fans.append("fan")
-        fan_types = ["controller_fan", "fan_generic", "heater_fan"]
-        for fan_type in fan_types:
-            fans.extend(iter(self.get_config_section_list(f"{fan_type} ")))
-        return fans
+        return list(self.fans)
 
     def get_output_pins(self):
-        output_pins = []
-        output_pins.extend(iter(self.get_config_section_list("output_pin ")))
-        return output_pins
+        return list(self.output_pins)
 
     def get_gcode_macros(self):
-        return self.get_config_section_list("gcode_macro ")
+        return list(self.sections_by_type.get("gcode_macro", []))
 
     def get_heaters(self):
-        heaters = []
-        if self.has_heated_bed():
-            heaters.append("heater_bed")
-        heaters.extend(iter(self.get_config_section_list("heater_generic ")))
-        heaters.extend(iter(self.get_config_section_list("temperature_sensor ")))
-        heaters.extend(iter(self.get_config_section_list("temperature_fan ")))
-        return heaters
+        return list(self.heaters)
 
     def get_filament_sensors(self):
-        sensors = list(self.get_config_section_list("filament_switch_sensor "))
-        sensors.extend(iter(self.get_config_section_list("filament_motion_sensor ")))
-        return sensors
+        return list(self.filament_sensors)
 
     def get_printer_status_data(self):
         data = {
@@ -331,19 +409,22 @@ class Printer:
         if section is not False:
             if section not in self.tempstore[device]:
                 return False
-            if results == 0 or results >= len(self.tempstore[device][section]):
-                return self.tempstore[device][section]
-            return self.tempstore[device][section][-results:]
+            return self.tempstore[device][section].last(results)
+
+        return {section: store.last(results) for section, store in self.tempstore[device].items()}
+
+    def get_temp_store_max(self, device, section):
+        if device not in self.tempstore or section not in self.tempstore[device]:
+            return 0
+        return self.tempstore[device][section].max()
 
-        temp = {}
-        for section in self.tempstore[device]:
-            if results == 0 or results >= len(self.tempstore[device][section]):
-                temp[section] = self.tempstore[device][section]
-            temp[section] = self.tempstore[device][section][-results:]
-        return temp
+    def get_temp_store_memory(self):
+        # Bytes used by the history of each device
+        return {device: sum(store.nbytes for store in self.tempstore[device].values())
+                for device in self.tempstore}
 
     def get_tools(self):
-        return self.tools
+        return list(self.tools)
 
     def get_tool_number(self, tool):
         return self.tools.index(tool)
@@ -356,13 +437,14 @@ class Printer:
         for dev in result:
             self.tempstore[dev] = {}
             if "targets" in result[dev]:
-                self.tempstore[dev]["targets"] = result[dev]["targets"]
+                self.tempstore[dev]["targets"] = RingBuffer(self.temp_store_size, result[dev]["targets"])
             if "temperatures" in result[dev]:
-                self.tempstore[dev]["temperatures"] = result[dev]["temperatures"]
+                self.tempstore[dev]["temperatures"] = RingBuffer(self.temp_store_size, result[dev]["temperatures"])
         logging.info(f"Temp store: {list(self.tempstore)}")
+        logging.debug(f"Temp store memory: {self.get_temp_store_memory()}")
 
     def config_section_exists(self, section):
-        return section in self.get_config_section_list()
+        return section in self.sections
 
     def set_callbacks(self, callbacks):
         for name, cb in callbacks.items():
@@ -378,10 +460,8 @@ class Printer:
     def _update_temp_store(self):
         for device in self.tempstore:
             for x in self.tempstore[device]:
-                if len(self.tempstore[device][x]) >= 1200:
-                    self.tempstore[device][x].pop(0)
                 temp = self.get_dev_stat(device, x[:-1])
                 if temp is None:
                     temp = 0
-                self.tempstore[device][x].append(round(temp, 2))
+                self.tempstore[device][x].append(temp)
         return True
@@ -0,0 +1,51 @@
+from array import array
+from collections import deque
+
+
+class RingBuffer:
+    # Fixed capacity float buffer, every value is written twice (at pos and pos + capacity)
+    # so the latest n values are always contiguous and can be returned as a memoryview without copying
+    def __init__(self, capacity, values=None, typecode='f'):
+        self.capacity = max(1, int(capacity))
+        self._data = array(typecode, bytes(2 * self.capacity * array(typecode).itemsize))
+        self._view = memoryview(self._data)
+        self._pos = 0
+        self._len = 0
+        # Decreasing (index, value) candidates for the maximum of the stored values
+        self._count = 0
+        self._max = deque()
+        if values is not None:
+            self.extend(values)
+
+    def __len__(self):
+        return self._len
+
+    def append(self, value):
+        self._data[self._pos] = value
+        self._data[self._pos + self.capacity] = value
+        self._pos = (self._pos + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+        self._count += 1
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((self._count, value))
+        if self._max[0][0] <= self._count - self.capacity:
+            self._max.popleft()
+
+    def extend(self, values):
+        for value in values[-self.capacity:]:
+            self.append(value)
+
+    def last(self, n=0):
+        # Read-only view of the last n values (all of them if n is 0), oldest first
+        n = self._len if n <= 0 else min(n, self._len)
+        end = self._pos + self.capacity
+        return self._view[end - n:end].toreadonly()
+
+    def max(self):
+        return self._max[0][1] if self._max else 0
+
+    @property
+    def nbytes(self):
+        return self._data.buffer_info()[1] * self._data.itemsize
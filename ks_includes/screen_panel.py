@@ -2,10 +2,12 @@ import gi
 import logging
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
+from gi.repository import GLib, Gtk
 
 
 class ScreenPanel:
+    # Events delivered to process_update while the panel is shown
+    topics = ("notify_status_update",)
 
     def __init__(self, screen, title, back=True):
         self.menu = None
@@ -19,6 +21,9 @@ class ScreenPanel:
         self.title = title
         self.devices = {}
         self.active_heaters = []
+        # Timers owned by the panel, they only run while the panel is shown
+        self.timers = {}
+        self.timers_running = False
 
         self.layout = Gtk.Layout()
         self.layout.set_size(self._screen.width, self._screen.height)
@@ -41,25 +46,107 @@ class ScreenPanel:
         else:
             self._screen._ws.klippy.emergency_stop()
 
+    def activate(self):
+        # Called when the panel is shown, the timers resume afterwards
+        return
+
+    def deactivate(self):
+        # Called when the panel is hidden, the timers are paused before
+        return
+
+    def destroy(self):
+        # Called when the panel is removed from the cache, the panel shouldn't be used afterwards
+        self.pause_timers()
+        self.timers.clear()
+        if self._files is not None:
+            for callback in [cb for cb in self._files.callbacks if getattr(cb, "__self__", None) is self]:
+                self._files.remove_file_callback(callback)
+        if self._printer is not None and self._printer.observers:
+            for callbacks in list(self._printer.observers.values()):
+                for callback, fields in callbacks:
+                    if getattr(callback, "__self__", None) is self:
+                        self._printer.remove_observer(callback)
+        self.content.destroy()
+        self.layout.destroy()
+        self.labels.clear()
+
+    def add_timer(self, name, seconds, callback, *args):
+        """
+        callback(*args) runs every few seconds while it returns True, fractions of a second use a millisecond timer.
+        Adding a timer with the same name replaces it
+        """
+        self.remove_timer(name)
+        self.timers[name] = {"seconds": seconds, "callback": callback, "args": args, "source": None}
+        if self.timers_running:
+            self._start_timer(name)
+
+    def remove_timer(self, name):
+        timer = self.timers.pop(name, None)
+        if timer is not None and timer['source'] is not None:
+            GLib.source_remove(timer['source'])
+
+    def has_timer(self, name):
+        return name in self.timers
+
+    def _start_timer(self, name):
+        seconds = self.timers[name]['seconds']
+        if isinstance(seconds, int):
+            self.timers[name]['source'] = GLib.timeout_add_seconds(seconds, self._run_timer, name)
+        else:
+            self.timers[name]['source'] = GLib.timeout_add(int(seconds * 1000), self._run_timer, name)
+
+    def _run_timer(self, name):
+        timer = self.timers.get(name)
+        if timer is None:
+            return False
+        if timer['callback'](*timer['args']):
+            return True
+        # The callback may have replaced or removed the timer
+        if self.timers.get(name) is timer:
+            del self.timers[name]
+        return False
+
+    def pause_timers(self):
+        self.timers_running = False
+        for timer in self.timers.values():
+            if timer['source'] is not None:
+                GLib.source_remove(timer['source'])
+                timer['source'] = None
+
+    def resume_timers(self):
+        # Paused timers start over with their full interval
+        self.timers_running = True
+        for name, timer in self.timers.items():
+            if timer['source'] is None:
+                self._start_timer(name)
+
+    def get_timers(self):
+        return {name: "running" if timer['source'] is not None else "paused" for name, timer in self.timers.items()}
+
     def get(self):
         return self.layout
 
+    def get_status_objects(self):
+        # Printer objects and fields needed while the panel is visible, besides the ones always subscribed
+        return {}
+
     def get_content(self):
         return self.content
 
-    def get_file_image(self, filename, width=None, height=None, small=False):
+    def get_file_image(self, filename, width=None, height=None):
         if not self._files.has_thumbnail(filename):
             return None
         width = width if width is not None else self._gtk.img_width
         height = height if height is not None else self._gtk.img_height
-        loc = self._files.get_thumbnail_location(filename, small)
-        if loc is None:
-            return None
-        if loc[0] == "file":
-            return self._gtk.PixbufFromFile(loc[1], width, height)
-        if loc[0] == "http":
-            return self._gtk.PixbufFromHttp(loc[1], width, height)
-        return None
+        return self._screen.thumbnails.get(filename, width, height)
+
+    def load_file_image(self, filename, callback, *args, width=None, height=None, group=None):
+        # The image is loaded in the background and passed to callback(pixbuf, *args)
+        if not self._files.has_thumbnail(filename):
+            return
+        width = width if width is not None else self._gtk.img_width
+        height = height if height is not None else self._gtk.img_height
+        self._screen.thumbnails.get_async(filename, width, height, callback, *args, group=group, priority=True)
 
     def get_title(self):
         return self.title
@@ -0,0 +1,34 @@
+import logging
+import time
+
+# Timeline of the startup, written to the log with --profile-startup
+start = time.perf_counter()
+enabled = False
+finished = False
+events = []
+totals = {}
+
+
+def mark(event):
+    if not finished:
+        events.append((time.perf_counter() - start, event))
+
+
+def add(name, seconds):
+    # Accumulates repeated work like icon loads, reported as a count and a total
+    if enabled and not finished:
+        count, total = totals.get(name, (0, 0))
+        totals[name] = (count + 1, total + seconds)
+
+
+def finish(event):
+    global finished
+    if finished:
+        return False
+    mark(event)
+    finished = True
+    if enabled:
+        lines = [f"{seconds * 1000:8.1f} ms  {name}" for seconds, name in events]
+        lines.extend(f"{total * 1000:8.1f} ms  {name} ({count})" for name, (count, total) in totals.items())
+        logging.info("Startup profile:\n" + "\n".join(lines))
+    return False
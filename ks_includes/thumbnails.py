@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GdkPixbuf, GLib
+
+
+class ThumbnailCache:
+    # Bytes of decoded pixbufs kept in memory and of scaled thumbnails kept on disk
+    max_memory = 16 * 1024 * 1024
+    max_disk = 64 * 1024 * 1024
+    # Thumbnails downloaded and decoded at the same time
+    workers = 2
+
+    def __init__(self, screen, printer):
+        self._screen = screen
+        self.printer = printer
+        self.pixbufs = OrderedDict()
+        self.memory = 0
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumbnails")
+        # Jobs waiting for a worker and the ones running, keyed like the pixbufs
+        self.queue = OrderedDict()
+        self.running = {}
+        # Bytes used on disk, updated by the workers as they save thumbnails
+        self.disk_used = 0
+        self.disk_lock = threading.Lock()
+        self.directory = screen._config.get_cache_path("thumbnails")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.prune_disk()
+        except OSError as e:
+            logging.error(f"Unable to use the thumbnail cache {self.directory}: {e}")
+            self.directory = None
+
+    def dialog_size(self):
+        # Size of the thumbnail in the print confirmation dialog
+        return self._screen.width * .9, self._screen.height * .6
+
+    def get_key(self, filename, thumbnail, width, height):
+        return (filename, thumbnail['relative_path'], int(width), int(height),
+                self._screen.files.get_file_info(filename)['modified'])
+
+    def get(self, filename, width, height):
+        thumbnail = self._screen.files.get_thumbnail(filename, width, height)
+        if thumbnail is None:
+            return None
+        key = self.get_key(filename, thumbnail, width, height)
+        if key in self.pixbufs:
+            self.pixbufs.move_to_end(key)
+            return self.pixbufs[key]
+        pixbuf = self.read(thumbnail, width, height, self.get_path(key))
+        if pixbuf is not None:
+            self.add(key, pixbuf)
+        return pixbuf
+
+    def get_async(self, filename, width, height, callback, *args, group=None, priority=False):
+        """
+        callback(pixbuf, *args) runs in the GTK thread, right away if the pixbuf is in memory.
+        Queued requests of a group can be dropped with cancel(group)
+        """
+        thumbnail = self._screen.files.get_thumbnail(filename, width, height)
+        if thumbnail is None:
+            return
+        key = self.get_key(filename, thumbnail, width, height)
+        if key in self.pixbufs:
+            self.pixbufs.move_to_end(key)
+            callback(self.pixbufs[key], *args)
+            return
+        job = self.running.get(key) or self.queue.get(key)
+        if job is None:
+            job = {"thumbnail": thumbnail, "width": width, "height": height, "group": group, "callbacks": []}
+            self.queue[key] = job
+        job['callbacks'].append((callback, args))
+        if priority and key in self.queue:
+            self.queue.move_to_end(key, last=False)
+        self._start_jobs()
+
+    def cancel(self, group):
+        for key in [key for key, job in self.queue.items() if job['group'] == group]:
+            del self.queue[key]
+
+    def _start_jobs(self):
+        while self.queue and len(self.running) < self.workers:
+            key, job = self.queue.popitem(last=False)
+            self.running[key] = job
+            self.executor.submit(self._run_job, key, job)
+
+    def _run_job(self, key, job):
+        pixbuf = None
+        try:
+            pixbuf = self.read(job['thumbnail'], job['width'], job['height'], self.get_path(key))
+        except Exception as e:
+            logging.exception(f"Unable to load thumbnail {job['thumbnail']['path']}: {e}")
+        finally:
+            GLib.idle_add(self._job_done, key, pixbuf)
+
+    def _job_done(self, key, pixbuf):
+        job = self.running.pop(key)
+        if pixbuf is not None:
+            self.add(key, pixbuf)
+            for callback, args in job['callbacks']:
+                callback(pixbuf, *args)
+        self._start_jobs()
+        return False
+
+    def read(self, thumbnail, width, height, path):
+        # From the disk cache, or loaded and scaled then saved to it
+        if path is not None and os.path.exists(path):
+            try:
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+                os.utime(path)
+                return pixbuf
+            except (GLib.Error, OSError) as e:
+                logging.debug(f"Unable to load cached thumbnail {path}: {e}")
+        pixbuf = self.load(thumbnail, width, height)
+        if pixbuf is not None:
+            self.save(pixbuf, path)
+        return pixbuf
+
+    def load(self, thumbnail, width, height):
+        try:
+            if thumbnail['local']:
+                return self._screen.gtk.PixbufFromFile(thumbnail['path'], width, height)
+            return self._screen.gtk.PixbufFromHttp(thumbnail['path'], width, height)
+        except GLib.Error as e:
+            logging.error(f"Unable to load thumbnail {thumbnail['path']}: {e}")
+            return None
+
+    def add(self, key, pixbuf):
+        self.pixbufs[key] = pixbuf
+        self.memory += pixbuf.get_byte_length()
+        while self.memory > self.max_memory and len(self.pixbufs) > 1:
+            self.memory -= self.pixbufs.popitem(last=False)[1].get_byte_length()
+
+    def get_path(self, key):
+        if self.directory is None:
+            return None
+        name = hashlib.sha1(repr((self.printer,) + key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.png")
+
+    def save(self, pixbuf, path):
+        if path is None:
+            return
+        try:
+            pixbuf.savev(path, "png", [], [])
+            size = os.path.getsize(path)
+        except (GLib.Error, OSError) as e:
+            logging.error(f"Unable to save thumbnail {path}: {e}")
+            return
+        with self.disk_lock:
+            self.disk_used += size
+            if self.disk_used > self.max_disk:
+                try:
+                    self.prune_disk()
+                except OSError as e:
+                    logging.error(f"Unable to prune the thumbnail cache {self.directory}: {e}")
+
+    def close(self):
+        self.queue.clear()
+        self.executor.shutdown(wait=False)
+
+    def prune_disk(self):
+        # Over the limit, the least recently used thumbnails are removed until the rest fits in half of it,
+        # so a full cache isn't scanned again for every new thumbnail
+        entries = sorted(os.scandir(self.directory), key=lambda entry: entry.stat().st_mtime)
+        sizes = [entry.stat().st_size for entry in entries]
+        self.disk_used = sum(sizes)
+        if self.disk_used <= self.max_disk:
+            return
+        for entry, size in zip(entries, sizes):
+            if self.disk_used <= self.max_disk // 2:
+                break
+            os.remove(entry.path)
+            self.disk_used -= size
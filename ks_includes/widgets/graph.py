@@ -1,3 +1,4 @@
+import cairo
 import datetime
 import gi
 import logging
@@ -22,6 +23,10 @@ class HeaterGraph(Gtk.DrawingArea):
         self.connect('touch-event', self.event_cb)
         self.connect('button_press_event', self.event_cb)
         self.font_size = round(font_size * 0.75)
+        # Frame, grid and scale labels are drawn once and reused until the size or the scale changes
+        self.background = None
+        self.background_key = None
+        self.hscale = 1
 
     def add_object(self, name, ev_type, rgb=None, dashed=False, fill=False):
         if rgb is None:
@@ -46,11 +51,8 @@ class HeaterGraph(Gtk.DrawingArea):
         return min(len(self.printer.get_temp_store(name, "temperatures"))
                    for name in self.store if "temperatures" in self.store[name])
 
-    def get_max_num(self, data_points=0):
-        mnum = []
-        for x in self.store:
-            mnum.extend(max(self.printer.get_temp_store(x, t, data_points)) for t in self.store[x] if t != "show")
-        return max(mnum)
+    def get_max_num(self):
+        return max(self.printer.get_temp_store_max(x, t) for x in self.store for t in self.store[x] if t != "show")
 
     def draw_graph(self, da, ctx):
         width = da.get_allocated_width()
@@ -61,20 +63,6 @@ class HeaterGraph(Gtk.DrawingArea):
         g_height_start = 10
         g_height = height - self.font_size * 2
 
-        ctx.set_source_rgb(.5, .5, .5)
-        ctx.set_line_width(1)
-        ctx.set_tolerance(0.1)
-
-        ctx.move_to(g_width_start, g_height_start)
-        ctx.line_to(g_width, g_height_start)
-        ctx.line_to(g_width, g_height)
-        ctx.line_to(g_width_start, g_height)
-        ctx.line_to(g_width_start, g_height_start)
-        ctx.stroke()
-
-        ctx.set_source_rgb(1, 0, 0)
-        ctx.move_to(g_width_start, height)
-
         gsize = [
             [g_width_start, g_height_start],
             [g_width, g_height]
@@ -83,42 +71,77 @@ class HeaterGraph(Gtk.DrawingArea):
         self.max_length = self.get_max_length()
         graph_width = gsize[1][0] - gsize[0][0]
         points_per_pixel = self.max_length / graph_width
-        data_points = int(round(graph_width * points_per_pixel, 0))
-        max_num = math.ceil(self.get_max_num(data_points) * 1.1 / 10) * 10
+        max_num = math.ceil(self.get_max_num() * 1.1 / 10) * 10
         d_width = 1 / points_per_pixel
 
-        d_height_scale = self.graph_lines(ctx, gsize, max_num)
+        self.draw_background(ctx, width, height, gsize, max_num)
         self.graph_time(ctx, gsize, points_per_pixel)
 
         for name in self.store:
             if not self.store[name]['show']:
                 continue
             for dev_type in self.store[name]:
-                d = self.printer.get_temp_store(name, dev_type, data_points)
+                d = self.printer.get_temp_store(name, dev_type, self.max_length)
                 if d is False:
                     continue
-                self.graph_data(ctx, d, gsize, d_height_scale, d_width, self.store[name][dev_type]["rgb"],
+                self.graph_data(ctx, d, gsize, self.hscale, d_width, self.store[name][dev_type]["rgb"],
                                 self.store[name][dev_type]["dashed"], self.store[name][dev_type]["fill"])
 
+    def draw_background(self, ctx, width, height, gsize, max_num):
+        key = (width, height, max_num)
+        if self.background is None or self.background_key != key:
+            self.background = ctx.get_target().create_similar(cairo.CONTENT_COLOR_ALPHA, width, height)
+            self.background_key = key
+            bg = cairo.Context(self.background)
+            bg.set_source_rgb(.5, .5, .5)
+            bg.set_line_width(1)
+            bg.set_tolerance(0.1)
+            bg.move_to(gsize[0][0], gsize[0][1])
+            bg.line_to(gsize[1][0], gsize[0][1])
+            bg.line_to(gsize[1][0], gsize[1][1])
+            bg.line_to(gsize[0][0], gsize[1][1])
+            bg.line_to(gsize[0][0], gsize[0][1])
+            bg.stroke()
+            self.hscale = self.graph_lines(bg, gsize, max_num)
+        ctx.set_source_surface(self.background, 0, 0)
+        ctx.paint()
+        ctx.set_line_width(1)
+        ctx.set_tolerance(0.1)
+
+    @staticmethod
+    def decimate(data, swidth):
+        # Minimum and maximum of the samples that fall in each pixel column
+        length = len(data)
+        columns = max(1, int(length * swidth))
+        for c in range(columns):
+            start = c * length // columns
+            chunk = data[start:max(start + 1, (c + 1) * length // columns)]
+            # The last column ends at the right edge of the graph
+            i = start if c < columns - 1 else length - 1
+            yield i, max(chunk)
+            yield i, min(chunk)
+
     @staticmethod
     def graph_data(ctx, data, gsize, hscale, swidth, rgb, dashed=False, fill=False):
-        i = 0
+        if len(data) == 0:
+            return
         ctx.set_source_rgba(rgb[0], rgb[1], rgb[2], 1)
-        ctx.move_to(gsize[0][0] + 1, gsize[0][1] - 1)
         if dashed:
             ctx.set_dash([10, 5])
         else:
             ctx.set_dash([1, 0])
+        # With more than 2 samples per pixel only the envelope of each column is drawn
+        points = HeaterGraph.decimate(data, swidth) if swidth < .5 else enumerate(data)
         d_len = len(data) - 1
-        for d in data:
+        first = True
+        for i, d in points:
             p_x = i * swidth + gsize[0][0] if i != d_len else gsize[1][0] - 1
             p_y = max(gsize[0][1], min(gsize[1][1], gsize[1][1] - 1 - (d * hscale)))
-            if i == 0:
+            if first:
                 ctx.move_to(gsize[0][0] + 1, p_y)
-                i += 1
+                first = False
                 continue
             ctx.line_to(p_x, p_y)
-            i += 1
         if fill is False:
             ctx.stroke()
             return
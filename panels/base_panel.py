@@ -5,8 +5,7 @@ import logging
 import os
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import GLib, Gtk, Pango
-from jinja2 import Environment
+from gi.repository import Gtk, Pango
 from datetime import datetime
 from math import log
 
@@ -19,7 +18,6 @@ class BasePanel(ScreenPanel):
         self.current_panel = None
         self.time_min = -1
         self.time_format = self._config.get_main_config().getboolean("24htime", True)
-        self.time_update = None
         self.titlebar_name_type = None
         self.buttons_showing = {
             'back': not back,
@@ -129,6 +127,8 @@ class BasePanel(ScreenPanel):
         try:
             for child in self.control['temp_box'].get_children():
                 self.control['temp_box'].remove(child)
+            if self._screen.printer is not None:
+                self._screen.printer.remove_observer(self.update_heater_label)
             if not show or self._screen.printer.get_temp_store_devices() is None:
                 return
 
@@ -149,6 +149,8 @@ class BasePanel(ScreenPanel):
                 if icon is not None:
                     self.labels[f'{device}_box'].pack_start(icon, False, False, 3)
                 self.labels[f'{device}_box'].pack_start(self.labels[device], False, False, 0)
+                self.update_heater_label(device)
+                self._screen.printer.add_observer(device, self.update_heater_label, ["temperature"])
 
             # Limit the number of items according to resolution
             nlimit = int(round(log(self._screen.width, 10) * 5 - 10.5) + 2)
@@ -216,8 +218,7 @@ class BasePanel(ScreenPanel):
             return self._gtk.Image("heat-up", img_size, img_size)
 
     def activate(self):
-        if self.time_update is None:
-            self.time_update = GLib.timeout_add_seconds(1, self.update_time)
+        self.add_timer("time", 1, self.update_time)
 
     def add_content(self, panel):
         self.current_panel = panel
@@ -235,25 +236,17 @@ class BasePanel(ScreenPanel):
                 or not hasattr(self.current_panel, "back"):
             self._screen._menu_go_back()
 
+    def get_status_objects(self):
+        objects = {}
+        if self._screen.printer is not None:
+            for device in self._screen.printer.get_tools() + self._screen.printer.get_heaters():
+                objects[device] = ["target", "temperature", "power"]
+        return objects
+
     def process_update(self, action, data):
         if action != "notify_status_update" or self._screen.printer is None:
             return
 
-        devices = self._screen.printer.get_temp_store_devices()
-        if devices is not None:
-            for device in devices:
-                temp = self._screen.printer.get_dev_stat(device, "temperature")
-                if temp is not None and device in self.labels:
-                    name = ""
-                    if not (device.startswith("extruder") or device.startswith("heater_bed")):
-                        if self.titlebar_name_type == "full":
-                            name = device.split()[1] if len(device.split()) > 1 else device
-                            name = f'{name.capitalize().replace("_", " ")}: '
-                        elif self.titlebar_name_type == "short":
-                            name = device.split()[1] if len(device.split()) > 1 else device
-                            name = f"{name[:1].upper()}: "
-                    self.labels[device].set_label(f"{name}{int(temp)}°")
-
         with contextlib.suppress(KeyError):
             if data["toolhead"]["extruder"] != self.current_extruder:
                 self.control['temp_box'].remove(self.labels[f"{self.current_extruder}_box"])
@@ -262,6 +255,20 @@ class BasePanel(ScreenPanel):
                 self.control['temp_box'].reorder_child(self.labels[f"{self.current_extruder}_box"], 0)
                 self.control['temp_box'].show_all()
 
+    def update_heater_label(self, device, fields=None):
+        temp = self._screen.printer.get_dev_stat(device, "temperature")
+        if temp is None or device not in self.labels:
+            return
+        name = ""
+        if not (device.startswith("extruder") or device.startswith("heater_bed")):
+            if self.titlebar_name_type == "full":
+                name = device.split()[1] if len(device.split()) > 1 else device
+                name = f'{name.capitalize().replace("_", " ")}: '
+            elif self.titlebar_name_type == "short":
+                name = device.split()[1] if len(device.split()) > 1 else device
+                name = f"{name[:1].upper()}: "
+        self.labels[device].set_label(f"{name}{int(temp)}°")
+
     def remove(self, widget):
         self.content.remove(widget)
 
@@ -305,6 +312,7 @@ class BasePanel(ScreenPanel):
             self.titlelbl.set_label(f"{self._screen.connecting_to_printer}")
             return
         try:
+            from jinja2 import Environment
             env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
             env.install_gettext_translations(self._config.get_lang())
             j2_temp = env.from_string(title)
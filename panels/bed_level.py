@@ -12,6 +12,7 @@ def create_panel(*args):
     return BedLevelPanel(*args)
 
 class BedLevelPanel(ScreenPanel):
+    topics = ("notify_gcode_response",)
     x_offset = 0
     y_offset = 0
 
@@ -184,6 +184,9 @@ class BedMeshPanel(ScreenPanel):
             if prof not in bm_profiles:
                 self.remove_profile(prof)
 
+    def get_status_objects(self):
+        return {"bed_mesh": ["profile_name", "mesh_max", "mesh_min", "probed_matrix", "profiles"]}
+
     def process_update(self, action, data):
         if action == "notify_status_update":
             with contextlib.suppress(KeyError):
@@ -23,6 +23,8 @@ COLORS = {
 
 
 class ConsolePanel(ScreenPanel):
+    topics = ("notify_gcode_response",)
+
     def __init__(self, screen, title, back=True):
         super().__init__(screen, title, back)
         self.autoscroll = True
@@ -139,7 +141,7 @@ class ConsolePanel(ScreenPanel):
             self.labels['tb'].delete(self.labels['tb'].get_iter_at_line(0), self.labels['tb'].get_iter_at_line(1))
 
     def gcode_response(self, result, method, params):
-        if method != "server.gcode_store":
+        if method != "server.gcode_store" or "error" in result:
             return
 
         for resp in result['result']['gcode_store']:
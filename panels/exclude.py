@@ -15,6 +15,8 @@ def create_panel(*args):
 
 
 class ExcludeObjectPanel(ScreenPanel):
+    topics = ("notify_status_update", "notify_gcode_response")
+
     def __init__(self, screen, title, back=True):
         super().__init__(screen, title, back)
         self._screen = screen
@@ -91,6 +93,9 @@ class ExcludeObjectPanel(ScreenPanel):
     def exclude_current(self, widget):
         self.exclude_object(widget, f"{self.current_object.get_label()}")
 
+    def get_status_objects(self):
+        return {"exclude_object": ["current_object", "objects", "excluded_objects"]}
+
     def process_update(self, action, data):
         if action == "notify_status_update":
             with contextlib.suppress(KeyError):
@@ -4,7 +4,6 @@ import re
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Pango
-from jinja2 import Environment
 
 from ks_includes.KlippyGcodes import KlippyGcodes
 from ks_includes.screen_panel import ScreenPanel
@@ -170,6 +169,9 @@ class ExtrudePanel(ScreenPanel):
 
         self.content.add(grid)
 
+    def get_status_objects(self):
+        return {sensor: ["enabled", "filament_detected"] for sensor in self._printer.get_filament_sensors()}
+
     def process_update(self, action, data):
         if action != "notify_status_update":
             return
@@ -248,6 +250,7 @@ class ExtrudePanel(ScreenPanel):
         ]
 
         try:
+            from jinja2 import Environment
             env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
             env.install_gettext_translations(self.lang)
             j2_temp = env.from_string(text)
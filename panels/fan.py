@@ -2,7 +2,7 @@ import gi
 import logging
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, GLib, Pango
+from gi.repository import Gtk, Pango
 
 from ks_includes.KlippyGcodes import KlippyGcodes
 from ks_includes.screen_panel import ScreenPanel
@@ -32,6 +32,9 @@ class FanPanel(ScreenPanel):
 
         self.content.add(scroll)
 
+    def get_status_objects(self):
+        return {fan: ["speed"] for fan in self._printer.get_fans()}
+
     def process_update(self, action, data):
         if action != "notify_status_update":
             return
@@ -146,7 +149,7 @@ class FanPanel(ScreenPanel):
         else:
             self._screen._ws.klippy.gcode_script(f"SET_FAN_SPEED FAN={fan.split()[1]} SPEED={float(value) / 100}")
         # Check the speed in case it wasn't applied
-        GLib.timeout_add_seconds(1, self.check_fan_speed, fan)
+        self.add_timer(f"check {fan}", 1, self.check_fan_speed, fan)
 
     def check_fan_speed(self, fan):
         self.update_fan_speed(None, fan, self._printer.get_fan_speed(fan))
@@ -135,6 +135,9 @@ class FineTunePanel(ScreenPanel):
 
         self.content.add(grid)
 
+    def get_status_objects(self):
+        return {"gcode_move": ["extrude_factor", "homing_origin", "speed_factor"]}
+
     def process_update(self, action, data):
 
         if action != "notify_status_update":
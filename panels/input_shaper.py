@@ -21,6 +21,8 @@ SHAPERS = ['zv', 'mzv', 'zvd', 'ei', '2hump_ei', '3hump_ei']
 
 
 class InputShaperPanel(ScreenPanel):
+    topics = ("notify_gcode_response",)
+
     def __init__(self, screen, title, back=True):
         super().__init__(screen, title, back)
         self.freq_xy_adj = {}
@@ -6,7 +6,7 @@ import time
 import contextlib
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import GLib, Gtk, Pango
+from gi.repository import Gtk, Pango
 from ks_includes.screen_panel import ScreenPanel
 from math import pi, sqrt
 from statistics import median
@@ -17,6 +17,8 @@ def create_panel(*args):
 
 
 class JobStatusPanel(ScreenPanel):
+    topics = ("notify_status_update", "notify_gcode_response")
+
     def __init__(self, screen, title, back=False):
         super().__init__(screen, title, False)
         self.grid = self._gtk.HomogeneousGrid()
@@ -32,7 +34,6 @@ class JobStatusPanel(ScreenPanel):
         self.fila_section = 0
         self.buttons = None
         self.filename_label = self.filename = self.prev_pos = self.prev_gpos = None
-        self.close_timeout = self.vel_timeout = self.animation_timeout = None
         self.file_metadata = self.fans = {}
         self.state = "standby"
         self.timeleft_type = "auto"
@@ -361,15 +362,10 @@ class JobStatusPanel(ScreenPanel):
         ps = self._printer.get_stat("print_stats")
         self.set_state(ps['state'])
         self.create_status_grid()
-        if self.vel_timeout is None:
-            self.vel_timeout = GLib.timeout_add_seconds(1, self.update_velocity)
+        if not self.has_timer("velocity"):
+            self.add_timer("velocity", 1, self.update_velocity)
         self._screen.base_panel_show_all()
 
-    def deactivate(self):
-        if self.vel_timeout is not None:
-            GLib.source_remove(self.vel_timeout)
-            self.vel_timeout = None
-
     def create_buttons(self):
 
         self.buttons = {
@@ -486,18 +482,13 @@ class JobStatusPanel(ScreenPanel):
 
     def close_panel(self, widget=None):
         logging.debug("Closing job_status panel")
-        self.remove_close_timeout()
+        self.remove_timer("close")
         self.state_check()
         if self.state not in ["printing", "paused", "cancelling"]:
             self._screen.printer_ready()
             self._printer.change_state("ready")
         return False
 
-    def remove_close_timeout(self):
-        if self.close_timeout is not None:
-            GLib.source_remove(self.close_timeout)
-            self.close_timeout = None
-
     def enable_button(self, *args):
         for arg in args:
             self.buttons[arg].set_sensitive(True)
@@ -512,10 +503,23 @@ class JobStatusPanel(ScreenPanel):
             self._files.remove_file_callback(self._callback_metadata)
 
     def new_print(self):
-        self.remove_close_timeout()
+        self.remove_timer("close")
         self._screen.close_screensaver()
         self.state_check()
 
+    def get_status_objects(self):
+        objects = {
+            "gcode_move": ["extrude_factor", "gcode_position", "homing_origin", "speed_factor", "speed"],
+            "motion_report": ["live_position", "live_velocity", "live_extruder_velocity"],
+            "exclude_object": ["current_object", "objects", "excluded_objects"],
+            "toolhead": ["max_accel"],
+        }
+        for extruder in self._printer.get_tools():
+            objects[extruder] = ["pressure_advance", "smooth_time"]
+        for fan in self._printer.get_fans():
+            objects[fan] = ["speed"]
+        return objects
+
     def process_update(self, action, data):
         if action == "notify_gcode_response":
             if "action:cancel" in data:
@@ -757,10 +761,10 @@ class JobStatusPanel(ScreenPanel):
 
     def _add_timeout(self, job_timeout):
         self._screen.close_screensaver()
-        self.remove_close_timeout()
+        self.remove_timer("close")
         timeout = self._config.get_main_config().getint(job_timeout, 0)
         if timeout != 0:
-            self.close_timeout = GLib.timeout_add_seconds(timeout, self.close_panel)
+            self.add_timer("close", timeout, self.close_panel)
         return False
 
     def set_state(self, state):
@@ -824,9 +828,7 @@ class JobStatusPanel(ScreenPanel):
             else:
                 width = self._screen.width / 3
                 height = self._gtk.get_content_height() * 0.47
-            pixbuf = self.get_file_image(self.filename, width, height)
-            if pixbuf is not None:
-                self.labels['thumbnail'].set_from_pixbuf(pixbuf)
+            self.load_file_image(self.filename, self.labels['thumbnail'].set_from_pixbuf, width=width, height=height)
 
     def update_filename(self):
         self.filename = self._printer.get_stat('print_stats', 'filename')
@@ -838,8 +840,8 @@ class JobStatusPanel(ScreenPanel):
             "limit": (self._screen.width * 24 / 480) // (self._gtk.get_font_size() / 11),
             "length": len(self.labels['file'].get_label())
         }
-        if self.animation_timeout is None and (self.filename_label['length'] - self.filename_label['limit']) > 0:
-            self.animation_timeout = GLib.timeout_add_seconds(1, self.animate_label)
+        if not self.has_timer("animation") and (self.filename_label['length'] - self.filename_label['limit']) > 0:
+            self.add_timer("animation", 1, self.animate_label)
         self.update_percent_complete()
         self.update_file_metadata()
 
@@ -876,6 +878,7 @@ class JobStatusPanel(ScreenPanel):
             self.file_metadata = {}
             logging.debug("Cannot find file metadata. Listening for updated metadata")
             self._screen.files.add_file_callback(self._callback_metadata)
+            self._files.request_metadata(self.filename, priority=True)
 
     def update_image_text(self, label, text):
         if label in self.labels and 'l' in self.labels[label]:
@@ -45,6 +45,9 @@ class LimitsPanel(ScreenPanel):
         self.content.add(scroll)
         self.content.show_all()
 
+    def get_status_objects(self):
+        return {"toolhead": ["max_accel", "max_accel_to_decel", "max_velocity", "square_corner_velocity"]}
+
     def process_update(self, action, data):
         if action != "notify_status_update":
             return
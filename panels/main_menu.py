@@ -1,4 +1,3 @@
-from email.mime import image
 import gi
 import logging
 
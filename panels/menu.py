@@ -3,7 +3,6 @@ import logging
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
-from jinja2 import Environment, Template
 
 from ks_includes.screen_panel import ScreenPanel
 
@@ -66,12 +65,14 @@ class MenuPanel(ScreenPanel):
         return self.grid
 
     def create_menu_items(self):
+        # jinja2 is slow to import, it's only loaded when a menu is built
+        from jinja2 import Environment
+        env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
+        env.install_gettext_translations(self._config.get_lang())
         for i in range(len(self.items)):
             key = list(self.items[i])[0]
             item = self.items[i][key]
 
-            env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
-            env.install_gettext_translations(self._config.get_lang())
             j2_temp = env.from_string(item['name'])
             parsed_name = j2_temp.render()
 
@@ -100,6 +101,7 @@ class MenuPanel(ScreenPanel):
 
         self.j2_data = self._printer.get_printer_status_data()
         try:
+            from jinja2 import Template
             j2_temp = Template(enable, autoescape=True)
             result = j2_temp.render(self.j2_data)
             return result == 'True'
@@ -159,6 +159,9 @@ class MovePanel(ScreenPanel):
             name = list(option)[0]
             self.add_option('options', self.settings, name, option[name])
 
+    def get_status_objects(self):
+        return {"gcode_move": ["gcode_position"]}
+
     def process_update(self, action, data):
         if action != "notify_status_update":
             return
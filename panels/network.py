@@ -22,7 +22,6 @@ class NetworkPanel(ScreenPanel):
         self.networks = {}
         self.interface = None
         self.prev_network = None
-        self.update_timeout = None
         self.network_interfaces = netifaces.interfaces()
         self.wireless_interfaces = [iface for iface in self.network_interfaces if iface.startswith('w')]
         self.wifi = None
@@ -89,15 +88,13 @@ class NetworkPanel(ScreenPanel):
 
             self.wifi.add_callback("connected", self.connected_callback)
             self.wifi.add_callback("scan_results", self.scan_callback)
-            if self.update_timeout is None:
-                self.update_timeout = GLib.timeout_add_seconds(5, self.update_all_networks)
+            self.add_timer("update", 5, self.update_all_networks)
         else:
             self.labels['networkinfo'] = Gtk.Label("")
             self.labels['networkinfo'].get_style_context().add_class('temperature_entry')
             box.pack_start(self.labels['networkinfo'], False, False, 0)
             self.update_single_network_info()
-            if self.update_timeout is None:
-                self.update_timeout = GLib.timeout_add_seconds(5, self.update_single_network_info)
+            self.add_timer("update", 5, self.update_single_network_info)
 
         self.content.add(box)
         self.labels['main_box'] = box
@@ -441,6 +438,7 @@ class NetworkPanel(ScreenPanel):
 
         self.labels['networkinfo'].set_markup(connected)
         self.labels['networkinfo'].show_all()
+        return True
 
     def reload_networks(self, widget=None):
         self.networks = {}
@@ -452,13 +450,3 @@ class NetworkPanel(ScreenPanel):
     def activate(self):
         if self.initialized:
             self.reload_networks()
-            if self.update_timeout is None:
-                if self.wifi is not None and self.wifi.is_initialized():
-                    self.update_timeout = GLib.timeout_add_seconds(5, self.update_all_networks)
-                else:
-                    self.update_timeout = GLib.timeout_add_seconds(5, self.update_single_network_info)
-
-    def deactivate(self):
-        if self.update_timeout is not None:
-            GLib.source_remove(self.update_timeout)
-            self.update_timeout = None
@@ -2,7 +2,7 @@ import gi
 import logging
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, GLib, Pango
+from gi.repository import Gtk, Pango
 
 from ks_includes.screen_panel import ScreenPanel
 
@@ -92,12 +92,15 @@ class OutputPinPanel(ScreenPanel):
         self._screen._ws.klippy.gcode_script(f'SET_PIN PIN={" ".join(pin.split(" ")[1:])} '
                                              f'VALUE={self.devices[pin]["scale"].get_value() / 100}')
         # Check the speed in case it wasn't applied
-        GLib.timeout_add_seconds(1, self.check_pin_value, pin)
+        self.add_timer(f"check {pin}", 1, self.check_pin_value, pin)
 
     def check_pin_value(self, pin):
         self.update_pin_value(None, pin, self._printer.get_pin_value(pin))
         return False
 
+    def get_status_objects(self):
+        return {pin: ["value"] for pin in self._printer.get_output_pins()}
+
     def process_update(self, action, data):
         if action != "notify_status_update":
             return
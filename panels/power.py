@@ -12,6 +12,8 @@ def create_panel(*args):
 
 
 class PowerPanel(ScreenPanel):
+    topics = ("notify_power_changed",)
+
     def initialize(self, panel_name):
 
         self.devices = {}
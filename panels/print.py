@@ -2,6 +2,8 @@
 import gi
 import logging
 import os
+import re
+from bisect import bisect_left, insort
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib, Pango
@@ -14,10 +16,48 @@ def create_panel(*args):
     return PrintPanel(*args)
 
 
+def natural_key(name):
+    # "file10" goes after "file9", the numbers are compared as integers
+    return tuple(int(part) if i % 2 else part for i, part in enumerate(re.split(r'(\d+)', name.lower())))
+
+
+class SortIndex:
+    # Entries of a directory kept sorted by name and by date
+    def __init__(self):
+        self.keys = {}
+        self.by_name = []
+        self.by_date = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, name):
+        return name in self.keys
+
+    def add(self, name, modified):
+        if name in self.keys:
+            self.remove(name)
+        key = natural_key(name)
+        self.keys[name] = (key, modified)
+        insort(self.by_name, (key, name))
+        insort(self.by_date, (modified, key, name))
+
+    def remove(self, name):
+        key, modified = self.keys.pop(name)
+        del self.by_name[bisect_left(self.by_name, (key, name))]
+        del self.by_date[bisect_left(self.by_date, (modified, key, name))]
+
+    def modified(self, name):
+        return self.keys[name][1]
+
+    def names(self, sort, reverse):
+        entries = self.by_date if sort == "date" else self.by_name
+        return [entry[-1] for entry in (reversed(entries) if reverse else entries)]
+
+
 class PrintPanel(ScreenPanel):
+    topics = ("notify_gcode_response",)
     cur_directory = "gcodes"
-    dir_panels = {}
-    filelist = {'gcodes': {'directories': [], 'files': []}}
 
     def __init__(self, screen, title, back=True):
         super().__init__(screen, title, back)
@@ -32,10 +72,20 @@ class PrintPanel(ScreenPanel):
         }
         self.sort_icon = ["arrow-up", "arrow-down"]
         self.scroll = self._gtk.ScrolledWindow()
-        self.files = {}
-        self.directories = {}
-        self.labels['directories'] = {}
-        self.labels['files'] = {}
+        self.scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        self.list = Gtk.Layout()
+        # Sorted entries of each directory that was entered, SortIndex for "directories" and "files"
+        self.index = {}
+        # Entries of the current directory as (is_directory, path), only the visible ones get a row
+        self.model = []
+        # Recycled row widgets, the row for the entry i is rows[i % len(rows)]
+        self.rows = []
+        # Entries that were on screen the last time the rows were placed, their metadata was already requested
+        self.visible_items = set()
+        self.row_height = 0
+        self.row_width = 0
+        self.refresh_source = None
+        self.active = False
 
     def initialize(self, panel_name):
         sort = Gtk.Label(_("Sort:"))
@@ -68,97 +118,77 @@ class PrintPanel(ScreenPanel):
         box.pack_start(pbox, False, False, 0)
         box.pack_start(self.scroll, True, True, 0)
 
-        self.dir_panels['gcodes'] = Gtk.Grid()
-
         GLib.idle_add(self.reload_files)
 
-        self.scroll.add(self.dir_panels['gcodes'])
+        self.list.connect("size-allocate", self.list_resized)
+        self.scroll.get_vadjustment().connect("value-changed", self.update_rows)
+        self.scroll.add(self.list)
         self.content.add(box)
         self._screen.files.add_file_callback(self._callback)
 
     def activate(self):
+        self.active = True
+        self.visible_items.clear()
         if self.cur_directory != "gcodes":
             self.change_dir(None, "gcodes")
+        else:
+            self.update_rows()
+
+    def deactivate(self):
+        self.active = False
+        self.visible_items.clear()
+        self._screen.files.cancel_metadata(self.cur_directory)
+        self._screen.thumbnails.cancel(self.cur_directory)
+
+    def sort_order(self):
+        return self.sort_current[0], self.sort_current[1] != 0
+
+    def get_index(self, directory):
+        # Directories are indexed the first time they are shown
+        if directory not in self.index:
+            catalog = self._screen.files.get_directory(directory)
+            if catalog is None:
+                return None
+            index = {"directories": SortIndex(), "files": SortIndex()}
+            for subdir in catalog['directories']:
+                if not subdir.split('/')[-1].startswith("."):
+                    index['directories'].add(subdir, self._screen.files.get_directory(subdir)['modified'])
+            for filename in catalog['files']:
+                if not filename.startswith("."):
+                    info = self._screen.files.get_file_info(f"{directory}/{filename}"[7:])
+                    index['files'].add(filename, info['modified'])
+            self.index[directory] = index
+        return self.index[directory]
+
+    def build_model(self):
+        index = self.get_index(self.cur_directory)
+        if index is None:
+            self.model = []
+        else:
+            sort, reverse = self.sort_order()
+            self.model = [(True, d) for d in index['directories'].names(sort, reverse)]
+            self.model.extend((False, f"{self.cur_directory}/{f}"[7:]) for f in index['files'].names(sort, reverse))
+        for row in self.rows:
+            row['item'] = None
+        self.update_rows()
+
+    def schedule_refresh(self):
+        if self.refresh_source is None:
+            self.refresh_source = GLib.idle_add(self.refresh)
+
+    def refresh(self):
+        self.refresh_source = None
+        self.build_model()
+        return False
 
-    def add_directory(self, directory, show=True):
-        parent_dir = '/'.join(directory.split('/')[:-1])
-        if directory not in self.filelist:
-            self.filelist[directory] = {'directories': [], 'files': [], 'modified': 0}
-            self.filelist[parent_dir]['directories'].append(directory)
-
-        if directory not in self.labels['directories']:
-            self._create_frame(directory)
-        reverse = self.sort_current[1] != 0
-        dirs = sorted(
-            self.filelist[parent_dir]['directories'],
-            reverse=reverse, key=lambda item: self.filelist[item]['modified']
-        ) if self.sort_current[0] == "date" else sorted(self.filelist[parent_dir]['directories'], reverse=reverse)
-
-        pos = dirs.index(directory)
-
-        self.dir_panels[parent_dir].insert_row(pos)
-        self.dir_panels[parent_dir].attach(self.directories[directory], 0, pos, 1, 1)
-        if show is True:
-            self.dir_panels[parent_dir].show_all()
-
-    def add_file(self, filepath, show=True):
-
-        fileinfo = self._screen.files.get_file_info(filepath)
-        if fileinfo is None:
-            return
-
-        d = f"gcodes/{filepath}".split('/')[:-1]
-        directory = '/'.join(d)
-        filename = filepath.split('/')[-1]
-        if filename.startswith("."):
-            return
-        for i in range(1, len(d)):
-            curdir = "/".join(d[:i])
-            newdir = "/".join(d[:i + 1])
-            if newdir not in self.filelist[curdir]['directories']:
-                if d[i].startswith("."):
-                    return
-                self.add_directory(newdir)
-
-        if filename not in self.filelist[directory]['files']:
-            for i in range(1, len(d)):
-                curdir = "/".join(d[:i + 1])
-                if curdir != "gcodes" and fileinfo['modified'] > self.filelist[curdir]['modified']:
-                    self.filelist[curdir]['modified'] = fileinfo['modified']
-                    self.labels['directories'][curdir]['info'].set_markup(
-                        '<small>' + _("Modified")
-                        + f' <b>{datetime.fromtimestamp(fileinfo["modified"]):%Y-%m-%d %H:%M}</b></small>'
-                    )
-
-            self.filelist[directory]['files'].append(filename)
-
-        if filepath not in self.files:
-            self._create_frame_file(filename, filepath)
-        reverse = self.sort_current[1] != 0
-        files = sorted(
-            self.filelist[directory]['files'],
-            reverse=reverse,
-            key=lambda item: self._screen.files.get_file_info(f"{directory}/{item}"[7:])['modified']
-        ) if self.sort_current[0] == "date" else sorted(self.filelist[directory]['files'], reverse=reverse)
-
-        pos = files.index(filename)
-        pos += len(self.filelist[directory]['directories'])
-
-        self.dir_panels[directory].insert_row(pos)
-        self.dir_panels[directory].attach(self.files[filepath], 0, pos, 1, 1)
-        if show is True:
-            self.dir_panels[directory].show_all()
-
-    def _create_frame(self, directory):
+    def _create_row(self):
         frame = Gtk.Frame()
         frame.get_style_context().add_class("frame-item")
 
         name = Gtk.Label()
-        name.set_markup(f"<big><b>{directory.split('/')[-1]}</b></big>")
         name.set_hexpand(True)
         name.set_halign(Gtk.Align.START)
-        name.set_line_wrap(True)
-        name.set_line_wrap_mode(Pango.WrapMode.WORD_CHAR)
+        name.set_ellipsize(Pango.EllipsizeMode.END)
 
         info = Gtk.Label()
         info.set_halign(Gtk.Align.START)
@@ -170,84 +200,183 @@ class PrintPanel(ScreenPanel):
         labels.set_valign(Gtk.Align.CENTER)
         labels.set_halign(Gtk.Align.START)
 
-        actions = self._gtk.ButtonImage("load", style="color3")
-        actions.connect("clicked", self.change_dir, directory)
-        actions.set_hexpand(False)
-        actions.set_halign(Gtk.Align.END)
+        load = self._gtk.ButtonImage("load", style="color3")
+        load.set_hexpand(False)
+        load.set_halign(Gtk.Align.END)
+        printb = self._gtk.ButtonImage("print", style="color3")
+        printb.set_hexpand(False)
+        printb.set_halign(Gtk.Align.END)
+
+        icon = Gtk.Button()
+        icon.set_always_show_image(True)
 
         file = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
         file.set_hexpand(True)
         file.set_vexpand(False)
-
-        icon = self._gtk.Image("folder")
-
         file.add(icon)
         file.add(labels)
-        file.add(actions)
+        file.add(load)
+        file.add(printb)
         frame.add(file)
 
-        self.directories[directory] = frame
-
-        self.labels['directories'][directory] = {
+        row = {
+            "frame": frame,
+            "name": name,
             "info": info,
-            "name": name
+            "icon": icon,
+            "folder": self._gtk.Image("folder"),
+            "file": self._gtk.Image("file"),
+            "load": load,
+            "print": printb,
+            "item": None
         }
+        icon.connect("clicked", self.row_icon_clicked, row)
+        load.connect("clicked", lambda widget: self.change_dir(widget, row['item'][1]))
+        printb.connect("clicked", lambda widget: self.confirm_print(widget, row['item'][1]))
+        frame.show_all()
+        # The visibility of the rows is handled here, not by the show_all of the screen
+        frame.set_no_show_all(True)
+        if self.row_height == 0:
+            # Every row has the height of a file with the three info lines
+            name.set_markup("<big><b>X</b></big>")
+            info.set_markup("<small>X\nX\nX</small>")
+            self.row_height = max(frame.get_preferred_height()[1], 1)
+        frame.set_size_request(self.row_width, self.row_height)
+        self.list.put(frame, 0, 0)
+        return row
+
+    def bind_row(self, row, item):
+        row['item'] = item
+        is_dir, path = item
+        if is_dir:
+            row['name'].set_markup(f"<big><b>{path.split('/')[-1]}</b></big>")
+            catalog = self._screen.files.get_directory(path)
+            if catalog is not None and catalog['modified']:
+                row['info'].set_markup(
+                    '<small>' + _("Modified")
+                    + f' <b>{datetime.fromtimestamp(catalog["modified"]):%Y-%m-%d %H:%M}</b></small>'
+                )
+            else:
+                row['info'].set_text("")
+            row['icon'].set_image(row['folder'])
+            row['folder'].show()
+            row['load'].show()
+            row['print'].hide()
+            return
+        filename = path.split('/')[-1]
+        row['name'].set_markup(f'<big><b>{os.path.splitext(filename)[0].replace("_", " ")}</b></big>')
+        row['info'].set_markup(self.get_file_info_str(path))
+        row['icon'].set_image(row['file'])
+        row['file'].show()
+        self.load_file_image(path, self.image_loaded, row, item, group=self.cur_directory)
+        row['load'].hide()
+        row['print'].set_visible(os.path.splitext(filename)[1] in [".gcode", ".g", ".gco"])
+
+    def update_rows(self, *args):
+        if self.row_height == 0:
+            self.rows.append(self._create_row())
+        self.list.set_size(self.row_width, len(self.model) * self.row_height)
+        adjustment = self.scroll.get_vadjustment()
+        page = adjustment.get_page_size() or self._screen.height
+        first = min(int(adjustment.get_value() // self.row_height), max(0, len(self.model) - 1))
+        count = min(int(page // self.row_height) + 2, len(self.model) - first)
+        if len(self.rows) < count:
+            while len(self.rows) < count:
+                self.rows.append(self._create_row())
+            # The entries are mapped to other rows when the pool grows
+            for row in self.rows:
+                row['item'] = None
+
+        visible = set()
+        visible_items = set(self.model[first:first + count])
+        for i in range(first, first + count):
+            row = self.rows[i % len(self.rows)]
+            visible.add(id(row))
+            if row['item'] != self.model[i]:
+                self.bind_row(row, self.model[i])
+            self.list.move(row['frame'], 0, i * self.row_height)
+            row['frame'].show()
+            if self.active and self.model[i] not in self.visible_items:
+                self.request_row_metadata(self.model[i])
+        for row in self.rows:
+            if id(row) not in visible:
+                row['frame'].hide()
+        if not self.active:
+            visible_items = set()
+        # Failed files stay out, so they are requested again once the file list is reloaded
+        self.visible_items = {item for item in visible_items if not self._screen.files.has_metadata_failed(item[1])}
+
+    def request_row_metadata(self, item):
+        is_dir, path = item
+        files = self._screen.files
+        if is_dir or files.has_metadata(path) or files.has_metadata_failed(path) or files.is_metadata_pending(path):
+            return
+        files.request_metadata(path, priority=True)
 
-        self.dir_panels[directory] = Gtk.Grid()
-
-    def _create_frame_file(self, filename, filepath):
-        frame = Gtk.Frame()
-        frame.get_style_context().add_class("frame-item")
-
-        name = Gtk.Label()
-        name.set_markup(f'<big><b>{os.path.splitext(filename)[0].replace("_", " ")}</b></big>')
-        name.set_hexpand(True)
-        name.set_halign(Gtk.Align.START)
-        name.set_line_wrap(True)
-        name.set_line_wrap_mode(Pango.WrapMode.CHAR)
-
-        info = Gtk.Label()
-        info.set_halign(Gtk.Align.START)
-        info.set_markup(self.get_file_info_str(filepath))
-        labels = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-        labels.add(name)
-        labels.add(info)
-        labels.set_vexpand(True)
-        labels.set_valign(Gtk.Align.CENTER)
-        labels.set_halign(Gtk.Align.START)
-
-        actions = self._gtk.ButtonImage("print", style="color3")
-        actions.connect("clicked", self.confirm_print, filepath)
-        actions.set_hexpand(False)
-        actions.set_halign(Gtk.Align.END)
-
-        file = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
-        file.set_hexpand(True)
-        file.set_vexpand(False)
-
-        icon = Gtk.Button()
-        GLib.idle_add(self.image_load, filepath)
-        icon.connect("clicked", self.confirm_delete_file, f"gcodes/{filepath}")
-
-        file.add(icon)
-        file.add(labels)
-        if os.path.splitext(filename)[1] in [".gcode", ".g", ".gco"]:
-            file.add(actions)
-        frame.add(file)
+    def list_resized(self, widget, allocation):
+        if allocation.width != self.row_width:
+            self.row_width = allocation.width
+            GLib.idle_add(self.resize_rows)
 
-        self.files[filepath] = frame
-        self.labels['files'][filepath] = {
-            "icon": icon,
-            "info": info,
-            "name": name
-        }
+    def resize_rows(self):
+        for row in self.rows:
+            row['frame'].set_size_request(self.row_width, self.row_height)
+        self.update_rows()
+        return False
 
-    def image_load(self, filepath):
-        pixbuf = self.get_file_image(filepath, small=True)
-        if pixbuf is not None:
-            self.labels['files'][filepath]['icon'].set_image(Gtk.Image.new_from_pixbuf(pixbuf))
+    def row_icon_clicked(self, widget, row):
+        if row['item'] is None:
+            return
+        is_dir, path = row['item']
+        if is_dir:
+            self.change_dir(widget, path)
         else:
-            self.labels['files'][filepath]['icon'].set_image(self._gtk.Image("file"))
+            self.confirm_delete_file(widget, f"gcodes/{path}")
+
+    def add_file(self, filepath):
+        d = f"gcodes/{filepath}".split('/')[:-1]
+        directory = '/'.join(d)
+        filename = filepath.split('/')[-1]
+        if filename.startswith(".") or any(part.startswith(".") for part in d[1:]):
+            return
+        for i in range(1, len(d)):
+            parent = "/".join(d[:i])
+            subdir = "/".join(d[:i + 1])
+            if parent in self.index:
+                modified = self._screen.files.get_directory(subdir)['modified']
+                index = self.index[parent]['directories']
+                if subdir not in index or index.modified(subdir) != modified:
+                    index.add(subdir, modified)
+        if directory in self.index:
+            self.index[directory]['files'].add(filename, self._screen.files.get_file_info(filepath)['modified'])
+
+    def delete_file(self, filepath):
+        d = f"gcodes/{filepath}".split('/')[:-1]
+        directory = '/'.join(d)
+        filename = filepath.split('/')[-1]
+        if directory in self.index and filename in self.index[directory]['files']:
+            self.index[directory]['files'].remove(filename)
+        # Directories left empty are gone from the catalog
+        for i in range(len(d) - 1, 0, -1):
+            subdir = "/".join(d[:i + 1])
+            if self._screen.files.get_directory(subdir) is not None:
+                break
+            self.index.pop(subdir, None)
+            parent = "/".join(d[:i])
+            if parent in self.index and subdir in self.index[parent]['directories']:
+                self.index[parent]['directories'].remove(subdir)
+        directory = self.cur_directory
+        while self._screen.files.get_directory(directory) is None:
+            directory = directory.rsplit('/', 1)[0]
+        if directory != self.cur_directory:
+            self.change_dir(None, directory)
+
+    def image_loaded(self, pixbuf, row, item):
+        if row['item'] != item:
+            return
+        image = Gtk.Image.new_from_pixbuf(pixbuf)
+        image.show()
+        row['icon'].set_image(image)
 
     def confirm_delete_file(self, widget, filepath):
         logging.debug(f"Sending delete_file {filepath}")
@@ -266,17 +395,17 @@ class PrintPanel(ScreenPanel):
         return False
 
     def change_dir(self, widget, directory):
-        if directory not in self.dir_panels:
+        if self._screen.files.get_directory(directory) is None:
             return
         logging.debug(f"Changing dir to {directory}")
 
-        for child in self.scroll.get_children():
-            self.scroll.remove(child)
+        self._screen.files.cancel_metadata(self.cur_directory)
+        self._screen.thumbnails.cancel(self.cur_directory)
+        self.visible_items.clear()
         self.cur_directory = directory
         self.labels['path'].set_text(f"  /{self.cur_directory[7:]}")
-
-        self.scroll.add(self.dir_panels[directory])
-        self.content.show_all()
+        self.scroll.get_vadjustment().set_value(0)
+        self.build_model()
 
     def change_sort(self, widget, key):
         if self.sort_current[0] == key:
@@ -290,7 +419,10 @@ class PrintPanel(ScreenPanel):
         self.labels[f'sort_{key}'].set_image(self._gtk.Image(self.sort_icon[self.sort_current[1]],
                                                              self._gtk.img_scale * .5))
         self.labels[f'sort_{key}'].show()
-        GLib.idle_add(self.reload_files)
+        # Both orders are kept indexed, only the rows on screen are bound again
+        self._screen.files.cancel_metadata(self.cur_directory)
+        self.visible_items.clear()
+        self.build_model()
 
         self._config.set("main", "print_sort_dir", f'{key}_{"asc" if self.sort_current[1] == 0 else "desc"}')
         self._config.save_user_config_options()
@@ -317,7 +449,7 @@ class PrintPanel(ScreenPanel):
         grid.set_valign(Gtk.Align.CENTER)
         grid.add(label)
 
-        pixbuf = self.get_file_image(filename, self._screen.width * .9, self._screen.height * .6)
+        pixbuf = self.get_file_image(filename, *self._screen.thumbnails.dialog_size())
         if pixbuf is not None:
             image = Gtk.Image.new_from_pixbuf(pixbuf)
             image.set_vexpand(False)
@@ -334,34 +466,6 @@ class PrintPanel(ScreenPanel):
         logging.info(f"Starting print: {filename}")
         self._screen._ws.klippy.print_start(filename)
 
-    def delete_file(self, filename):
-        dir_parts = f"gcodes/{filename}".split('/')[:-1]
-        directory = '/'.join(dir_parts)
-        if directory not in self.filelist or filename.split('/')[-1].startswith("."):
-            return
-        self.filelist[directory]["files"].pop(self.filelist[directory]["files"].index(filename.split('/')[-1]))
-        i = len(dir_parts)
-        while i > 1:
-            cur_dir = '/'.join(dir_parts[:i])
-            if len(self.filelist[cur_dir]['directories']) > 0 or len(self.filelist[cur_dir]['files']) > 0:
-                break
-            par_dir = '/'.join(cur_dir.split('/')[:-1])
-
-            if self.cur_directory == cur_dir:
-                self.change_dir(None, par_dir)
-
-            del self.filelist[cur_dir]
-            self.filelist[par_dir]['directories'].pop(self.filelist[par_dir]['directories'].index(cur_dir))
-            self.dir_panels[par_dir].remove(self.directories[cur_dir])
-            del self.directories[cur_dir]
-            del self.labels['directories'][cur_dir]
-            self.dir_panels[par_dir].show_all()
-            i -= 1
-
-        self.dir_panels[directory].remove(self.files[filename])
-        self.dir_panels[directory].show_all()
-        self.files.pop(filename)
-
     def get_file_info_str(self, filename):
 
         fileinfo = self._screen.files.get_file_info(filename)
@@ -378,25 +482,22 @@ class PrintPanel(ScreenPanel):
         return info
 
     def reload_files(self, widget=None):
-        self.filelist = {'gcodes': {'directories': [], 'files': []}}
-        for dirpan in self.dir_panels:
-            for child in self.dir_panels[dirpan].get_children():
-                self.dir_panels[dirpan].remove(child)
-
-        flist = sorted(self._screen.files.get_file_list(), key=lambda item: '/' in item)
-        for file in flist:
-            GLib.idle_add(self.add_file, file)
+        self.index = {}
+        self.build_model()
 
     def update_file(self, filename):
-        if filename not in self.labels['files']:
-            logging.debug(f"Cannot update file, file not in labels: {filename}")
-            return
-
-        logging.info(f"Updating file {filename}")
-        self.labels['files'][filename]['info'].set_markup(self.get_file_info_str(filename))
-
-        # Update icon
-        GLib.idle_add(self.image_load, filename)
+        directory = f"gcodes/{filename}".rsplit('/', 1)[0]
+        name = filename.split('/')[-1]
+        if directory in self.index and name in self.index[directory]['files']:
+            index = self.index[directory]['files']
+            modified = self._screen.files.get_file_info(filename)['modified']
+            if index.modified(name) != modified:
+                index.add(name, modified)
+                self.schedule_refresh()
+        for row in self.rows:
+            if row['item'] == (False, filename):
+                logging.info(f"Updating file {filename}")
+                self.bind_row(row, row['item'])
 
     def _callback(self, newfiles, deletedfiles, updatedfiles=None):
         logging.debug(f"newfiles: {newfiles}")
@@ -405,6 +506,8 @@ class PrintPanel(ScreenPanel):
         logging.debug(f"deletedfiles: {deletedfiles}")
         for file in deletedfiles:
             self.delete_file(file)
+        if newfiles or deletedfiles:
+            self.schedule_refresh()
         if updatedfiles is not None:
             logging.debug(f"updatefiles: {updatedfiles}")
             for file in updatedfiles:
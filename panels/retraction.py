@@ -13,6 +13,7 @@ def create_panel(*args):
 
 
 class FWRetractionPanel(ScreenPanel):
+    topics = ("notify_status_update", "notify_gcode_response")
 
     def __init__(self, screen, title, back=True):
         super().__init__(screen, title, back)
@@ -71,6 +72,10 @@ class FWRetractionPanel(ScreenPanel):
     def activate(self):
         self._screen._ws.klippy.gcode_script("GET_RETRACTION")
 
+    def get_status_objects(self):
+        return {"firmware_retraction": ["retract_length", "retract_speed", "unretract_extra_length",
+                                        "unretract_speed"]}
+
     def process_update(self, action, data):
         if action == "notify_status_update" and "firmware_retraction" in data:
             for opt in self.list:
@@ -180,9 +180,13 @@ class TemperaturePanel(ScreenPanel):
                 logging.info(f"Setting {heater} to {target}")
 
     def activate(self):
-        return
+        # Only the devices that changed are refreshed while the panel is visible
+        for device in self._printer.get_tools() + self._printer.get_heaters():
+            self.update_device(device)
+            self._printer.add_observer(device, self.update_device, ["temperature", "target", "power"])
 
     def deactivate(self):
+        self._printer.remove_observer(self.update_device)
         if self.active_heater is not None:
             self.hide_numpad()
 
@@ -406,25 +410,13 @@ class TemperaturePanel(ScreenPanel):
     def popover_closed(self, widget):
         self.popover_device = None
 
-    def process_update(self, action, data):
-        if action != "notify_status_update":
-            return
-
-        for x in self._printer.get_tools():
-            self.update_temp(
-                x,
-                self._printer.get_dev_stat(x, "temperature"),
-                self._printer.get_dev_stat(x, "target"),
-                self._printer.get_dev_stat(x, "power"),
-            )
-        for h in self._printer.get_heaters():
-            self.update_temp(
-                h,
-                self._printer.get_dev_stat(h, "temperature"),
-                self._printer.get_dev_stat(h, "target"),
-                self._printer.get_dev_stat(h, "power"),
-            )
-        return
+    def update_device(self, device, fields=None):
+        self.update_temp(
+            device,
+            self._printer.get_dev_stat(device, "temperature"),
+            self._printer.get_dev_stat(device, "target"),
+            self._printer.get_dev_stat(device, "power"),
+        )
 
     def show_numpad(self, widget, device=None):
         for d in self.active_heaters:
@@ -1,9 +1,10 @@
 import gi
 import logging
 import os
+import threading
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, Pango, GLib
+from gi.repository import GLib, Gtk, Pango
 
 from ks_includes.screen_panel import ScreenPanel
 
@@ -27,12 +28,15 @@ ALLOWED_SERVICES = (
 
 
 class SystemPanel(ScreenPanel):
+    topics = ("notify_update_response",)
+
     def __init__(self, screen, title, back=True):
         super().__init__(screen, title, back)
         self.refresh = None
         self.update_status = None
         self.update_dialog = None
         self.update_prog = None
+        self.fetching_updates = False
 
     def initialize(self, panel_name):
 
@@ -92,10 +96,27 @@ class SystemPanel(ScreenPanel):
     def refresh_updates(self, widget=None):
         self.refresh.set_sensitive(False)
         self._screen.show_popup_message(_("Checking for updates, please wait..."), level=1)
-        GLib.timeout_add_seconds(1, self.get_updates, "true")
+        self.add_timer("refresh", 1, self.get_updates, "true")
 
     def get_updates(self, refresh="false"):
-        update_resp = self._screen.apiclient.send_request(f"machine/update/status?refresh={refresh}")
+        # Refreshing checks every repository and can take a while, so the request runs in a thread
+        if not self.fetching_updates:
+            self.fetching_updates = True
+            threading.Thread(target=self._fetch_updates, args=(refresh,), daemon=True).start()
+        return False
+
+    def _fetch_updates(self, refresh):
+        timeout = None if refresh == "false" else 120
+        update_resp = False
+        try:
+            update_resp = self._screen.apiclient.send_request(f"machine/update/status?refresh={refresh}", timeout)
+        except Exception as e:
+            logging.exception(f"Error getting the update status:\n{e}")
+        finally:
+            GLib.idle_add(self._updates_received, update_resp)
+
+    def _updates_received(self, update_resp):
+        self.fetching_updates = False
         if not update_resp:
             logging.info("No update manager configured")
         else:
@@ -106,6 +127,7 @@ class SystemPanel(ScreenPanel):
                 self.update_program_info(prog)
         self.refresh.set_sensitive(True)
         self._screen.close_popup_message()
+        return False
 
     def process_update(self, action, data):
         if action == "notify_update_response":
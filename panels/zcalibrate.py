@@ -14,6 +14,7 @@ def create_panel(*args):
 
 
 class ZCalibratePanel(ScreenPanel):
+    topics = ("notify_status_update", "notify_gcode_response")
     _screen = None
     widgets = {}
     distances = ['.01', '.05', '.1', '.5', '1', '5']
@@ -237,6 +238,9 @@ class ZCalibratePanel(ScreenPanel):
         logging.info(f"Moving to X:{x_position} Y:{y_position}")
         self._screen._ws.klippy.gcode_script(f'G0 X{x_position} Y{y_position} F3000')
 
+    def get_status_objects(self):
+        return {"toolhead": ["position"]}
+
     def process_update(self, action, data):
 
         if action == "notify_status_update":
@@ -1,5 +1,8 @@
 #!/usr/bin/python
 
+# Imported first so that the startup timeline includes the imports
+from ks_includes import startup
+
 import argparse
 import gi
 
@@ -10,10 +13,12 @@ import os
 import signal
 import subprocess
 import pathlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Gdk, GLib, Pango
-from jinja2 import Environment
 
 from ks_includes import functions
 from ks_includes.KlippyWebsocket import KlippyWebsocket
@@ -21,10 +26,14 @@ from ks_includes.KlippyRest import KlippyRest
 from ks_includes.files import KlippyFiles
 from ks_includes.KlippyGtk import KlippyGtk
 from ks_includes.printer import Printer
+from ks_includes.thumbnails import ThumbnailCache
 from ks_includes.widgets.keyboard import Keyboard
 from ks_includes.config import KlipperScreenConfig
+from ks_includes.events import EventBus
 from panels.base_panel import BasePanel
 
+startup.mark("imports")
+
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
 PRINTER_BASE_STATUS_OBJECTS = [
@@ -46,6 +55,21 @@ PRINTER_BASE_STATUS_OBJECTS = [
     'exclude_object',
 ]
 
+# Config sections that are also printer objects with a status
+PRINTER_DEVICE_PREFIXES = (
+    'extruder',
+    'heater_bed',
+    'heater_generic ',
+    'temperature_sensor ',
+    'temperature_fan ',
+    'fan',
+    'controller_fan ',
+    'heater_fan ',
+    'filament_switch_sensor ',
+    'filament_motion_sensor ',
+    'output_pin ',
+)
+
 klipperscreendir = pathlib.Path(__file__).parent.resolve()
 
 
@@ -73,23 +97,35 @@ class KlipperScreen(Gtk.Window):
     connected_printer = None
     currentPanel = None
     files = None
+    thumbnails = None
     filename = ""
     keyboard = None
     last_update = {}
     load_panel = {}
     number_tools = 1
-    panels = {}
+    # Panels kept after being closed, ordered from the least recently shown
+    panels = OrderedDict()
+    panel_cache_size = 10
+    # Root panels, never evicted from the cache
+    pinned_panels = ("main_panel", "job_status", "printer_select", "splash_screen")
+    warmup_source = None
+    # Rough size of a widget in bytes, to estimate the memory held by a panel
+    widget_memory = 1024
     popup_message = None
     screensaver = None
     printer = None
     printer_select_callbacks = []
     printer_select_prepanel = None
     subscriptions = []
+    subscribed_objects = None
+    subscription_source = None
     shutdown = True
     updating = False
     update_queue = []
     _ws = None
     init_printer_timeout = None
+    init_printer_thread = None
+    init_printer_callbacks = []
     dpms_timeout = None
     screensaver_timeout = None
     reinit_count = 0
@@ -105,6 +141,7 @@ class KlipperScreen(Gtk.Window):
         configfile = os.path.normpath(os.path.expanduser(args.configfile))
 
         self._config = KlipperScreenConfig(configfile, self)
+        startup.mark("config")
         self.lang_ltr = set_text_direction(self._config.get_main_config().get("language", None))
 
         Gtk.Window.__init__(self)
@@ -119,14 +156,22 @@ class KlipperScreen(Gtk.Window):
         self.vertical_mode = self.width < self.height
         logging.info(f"Screen resolution: {self.width}x{self.height}")
         self.theme = self._config.get_main_config().get('theme')
+        self.panel_cache_size = max(1, self._config.get_main_config().getint("panel_cache_size", 10))
         show_cursor = self._config.get_main_config().getboolean("show_cursor", fallback=False)
         self.gtk = KlippyGtk(self, self.width, self.height, self.theme, show_cursor,
                              self._config.get_main_config().get("font_size", "medium"))
+        startup.mark("gtk helpers and icon pack")
         self.init_style()
+        startup.mark("css")
         self.set_icon_from_file(os.path.join(klipperscreendir, "styles", "icon.svg"))
 
+        self.events = EventBus()
+        self.subscribe_events()
         self.base_panel = BasePanel(self, title="Base Panel", back=False)
+        self.events.subscribe("notify_status_update", self.base_panel.process_update, owner="base_panel")
         self.add(self.base_panel.get())
+        startup.mark("base panel")
+        self.first_frame_handler = self.connect_after("draw", self.first_frame)
         self.show_all()
         if show_cursor:
             self.get_window().set_cursor(Gdk.Cursor.new(Gdk.CursorType.ARROW))
@@ -135,6 +180,7 @@ class KlipperScreen(Gtk.Window):
             self.get_window().set_cursor(Gdk.Cursor.new(Gdk.CursorType.BLANK_CURSOR))
             os.system("xsetroot  -cursor ks_includes/emptyCursor.xbm ks_includes/emptyCursor.xbm")
         self.base_panel.activate()
+        self.base_panel.resume_timers()
 
         self.printer_initializing(_("Initializing"))
         if self._config.errors:
@@ -145,6 +191,11 @@ class KlipperScreen(Gtk.Window):
 
         self.initial_connection()
 
+    def first_frame(self, *args):
+        startup.mark("first frame")
+        self.disconnect(self.first_frame_handler)
+        return False
+
     def initial_connection(self):
         printers = self._config.get_printers()
         default_printer = self._config.get_main_config().get('default_printer')
@@ -182,9 +233,18 @@ class KlipperScreen(Gtk.Window):
         # Cleanup
         self.printer_select_callbacks = []
         self.printer_select_prepanel = None
+        self.init_printer_callbacks = []
+        if self.init_printer_timeout is not None:
+            GLib.source_remove(self.init_printer_timeout)
+            self.init_printer_timeout = None
+        # A bootstrap still running is for the previous printer, its result is dropped when it ends
+        self.init_printer_thread = None
         if self.files is not None:
             self.files.reset()
             self.files = None
+        if self.thumbnails is not None:
+            self.thumbnails.close()
+            self.thumbnails = None
         if self.printer is not None:
             self.printer.reset()
             self.printer = None
@@ -202,6 +262,8 @@ class KlipperScreen(Gtk.Window):
         self.connecting = True
 
         logging.info(f"Connecting to printer: {name}")
+        if self.apiclient is not None:
+            self.apiclient.close()
         self.apiclient = KlippyRest(data["moonraker_host"], data["moonraker_port"], data["moonraker_api_key"])
 
         self.printer = Printer({
@@ -217,12 +279,15 @@ class KlipperScreen(Gtk.Window):
                 'is_active': False
             }
         }, self.state_execute)
+        self.printer.temp_store_size = max(60, self._config.get_main_config().getint("temperature_history", 1200))
 
         self._remove_all_panels()
-        self.subscriptions = []
+        for panel_name in list(self.subscriptions):
+            self.remove_subscription(panel_name)
+        self.subscribed_objects = None
         for panel in list(self.panels):
             if panel not in ["printer_select", "splash_screen"]:
-                del self.panels[panel]
+                self.remove_panel(panel)
         for dialog in self.dialogs:
             dialog.destroy()
         self.base_panel.show_printer_select(True)
@@ -249,48 +314,59 @@ class KlipperScreen(Gtk.Window):
                                    )
 
         self.files = KlippyFiles(self)
+        self.thumbnails = ThumbnailCache(self, name)
         self._ws.initial_connect()
         self.connecting = False
 
         self.connected_printer = name
         logging.debug(f"Connected to printer: {name}")
 
-    def ws_subscribe(self):
-        requested_updates = {
-            "objects": {
-                "bed_mesh": ["profile_name", "mesh_max", "mesh_min", "probed_matrix", "profiles"],
-                "configfile": ["config"],
-                "display_status": ["progress", "message"],
-                "fan": ["speed"],
-                "gcode_move": ["extrude_factor", "gcode_position", "homing_origin", "speed_factor", "speed"],
-                "idle_timeout": ["state"],
-                "pause_resume": ["is_paused"],
-                "print_stats": ["print_duration", "total_duration", "filament_used", "filename", "state", "message",
-                                "info"],
-                "toolhead": ["homed_axes", "estimated_print_time", "print_time", "position", "extruder",
-                             "max_accel", "max_accel_to_decel", "max_velocity", "square_corner_velocity"],
-                "virtual_sdcard": ["file_position", "is_active", "progress"],
-                "webhooks": ["state", "state_message"],
-                "firmware_retraction": ["retract_length", "retract_speed", "unretract_extra_length", "unretract_speed"],
-                "motion_report": ["live_position", "live_velocity", "live_extruder_velocity"],
-                "exclude_object": ["current_object", "objects", "excluded_objects"]
-            }
+    def get_subscription_objects(self):
+        # Objects needed for the state of the printer, panels request anything else they show
+        objects = {
+            "display_status": ["progress", "message"],
+            "idle_timeout": ["state"],
+            "pause_resume": ["is_paused"],
+            "print_stats": ["print_duration", "total_duration", "filament_used", "filename", "state", "message",
+                            "info"],
+            "toolhead": ["homed_axes", "extruder"],
+            "virtual_sdcard": ["file_position", "is_active", "progress"],
+            "webhooks": ["state", "state_message"],
         }
-        for extruder in self.printer.get_tools():
-            requested_updates['objects'][extruder] = [
-                "target", "temperature", "pressure_advance", "smooth_time", "power"]
-        for h in self.printer.get_heaters():
-            requested_updates['objects'][h] = ["target", "temperature", "power"]
-        for f in self.printer.get_fans():
-            requested_updates['objects'][f] = ["speed"]
-        for f in self.printer.get_filament_sensors():
-            requested_updates['objects'][f] = ["enabled", "filament_detected"]
-        for p in self.printer.get_output_pins():
-            requested_updates['objects'][p] = ["value"]
-
-        self._ws.klippy.object_subscription(requested_updates)
+        panels = [self.base_panel]
+        if self._cur_panels and self._cur_panels[-1] in self.panels:
+            panels.append(self.panels[self._cur_panels[-1]])
+        for panel in panels:
+            for obj, fields in panel.get_status_objects().items():
+                if obj not in objects:
+                    objects[obj] = []
+                objects[obj].extend(field for field in fields if field not in objects[obj])
+        return objects
 
-    def _load_panel(self, panel, *args):
+    def ws_subscribe(self):
+        self.subscribed_objects = self.get_subscription_objects()
+        self._ws.klippy.object_subscription({"objects": self.subscribed_objects}, self._subscription_callback)
+
+    def update_subscription(self):
+        # Deferred so that several panel changes in a row only send one request
+        if self.subscription_source is None:
+            self.subscription_source = GLib.idle_add(self._update_subscription)
+
+    def _update_subscription(self):
+        self.subscription_source = None
+        if self.subscribed_objects is None or self._ws is None or not self._ws.is_connected():
+            return False
+        if self.get_subscription_objects() != self.subscribed_objects:
+            logging.debug("Updating object subscription")
+            self.ws_subscribe()
+        return False
+
+    def _subscription_callback(self, result, method, params):
+        # The response contains the current status of the subscribed objects
+        if "result" in result and "status" in result['result']:
+            self._websocket_callback("notify_status_update", result['result']['status'])
+
+    def _import_panel(self, panel):
         if panel not in self.load_panel:
             logging.debug(f"Loading panel: {panel}")
             panel_path = os.path.join(os.path.dirname(__file__), 'panels', f"{panel}.py")
@@ -307,6 +383,8 @@ class KlipperScreen(Gtk.Window):
                 raise Exception(msg)
             self.load_panel[panel] = getattr(module, "create_panel")
 
+    def _load_panel(self, panel, *args):
+        self._import_panel(panel)
         try:
             return self.load_panel[panel](*args)
         except Exception as e:
@@ -315,24 +393,16 @@ class KlipperScreen(Gtk.Window):
             raise Exception(msg) from e
 
     def show_panel(self, panel_name, panel_type, title, remove=None, pop=True, **kwargs):
-        if panel_name not in self.panels:
+        if panel_name in self.panels:
+            self.panels.move_to_end(panel_name)
+        else:
             try:
-                self.panels[panel_name] = self._load_panel(panel_type, self, title)
-
-                if kwargs != {}:
-                    self.panels[panel_name].initialize(panel_name, **kwargs)
-                else:
-                    self.panels[panel_name].initialize(panel_name)
+                self._create_panel(panel_name, panel_type, title, **kwargs)
             except Exception as e:
-                if panel_name in self.panels:
-                    del self.panels[panel_name]
                 logging.exception(f"Unable to load panel {panel_type}")
                 self.show_error_modal(f"Unable to load panel {panel_type}", f"{e}")
                 return
 
-            if hasattr(self.panels[panel_name], "process_update"):
-                self.panels[panel_name].process_update("notify_status_update", self.printer.get_data())
-
         try:
             if remove == 2:
                 self._remove_all_panels()
@@ -352,14 +422,137 @@ class KlipperScreen(Gtk.Window):
             if hasattr(self.panels[panel_name], "process_update"):
                 self.panels[panel_name].process_update("notify_status_update", self.printer.get_updates())
                 self.add_subscription(panel_name)
-            if hasattr(self.panels[panel_name], "activate"):
-                self.panels[panel_name].activate()
-                self.show_all()
+            self.panels[panel_name].activate()
+            self.panels[panel_name].resume_timers()
+            self.show_all()
         except Exception as e:
             logging.exception(f"Error attaching panel:\n{e}")
 
         self._cur_panels.append(panel_name)
         logging.debug(f"Current panel hierarchy: {self._cur_panels}")
+        logging.debug(f"Panel timers: {self.get_panel_timers()}")
+        self.update_subscription()
+        self.trim_panels()
+
+    def _create_panel(self, panel_name, panel_type, title, **kwargs):
+        try:
+            self.panels[panel_name] = self._load_panel(panel_type, self, title)
+
+            if kwargs != {}:
+                self.panels[panel_name].initialize(panel_name, **kwargs)
+            else:
+                self.panels[panel_name].initialize(panel_name)
+        except Exception:
+            if panel_name in self.panels:
+                self.remove_panel(panel_name)
+            raise
+
+        if hasattr(self.panels[panel_name], "process_update"):
+            self.panels[panel_name].process_update("notify_status_update", self.printer.get_data())
+
+    def get_warmup_panels(self, panel_types):
+        # Panels of the main menu to build ahead, with the submenus leading to them,
+        # named like the navigation would name them
+        paths = {}
+        menus = [("main_panel", "", [])]
+        while menus:
+            parent, subsection, path = menus.pop(0)
+            for menu_item in self._config.get_menu_items("__main", subsection):
+                key = list(menu_item)[0]
+                item = menu_item[key]
+                if item['panel'] is not False:
+                    if item['panel'] in panel_types and item['panel'] not in paths:
+                        paths[item['panel']] = path + [(f"{parent}_{item['panel']}", item['panel'], item['name'], {})]
+                elif item['method'] is False:
+                    name = f"{parent}_{key}"
+                    disname = self._config.get_menu_name("__main", key)
+                    items = self._config.get_menu_items("__main", key)
+                    panel = (name, "menu", disname, {"display_name": disname, "items": items})
+                    menus.append((name, key, path + [panel]))
+        panels = []
+        for panel_type in panel_types:
+            for panel in paths.get(panel_type, []):
+                if panel[0] not in [p[0] for p in panels]:
+                    panels.append(panel)
+        return panels
+
+    def start_warmup(self):
+        self.stop_warmup()
+        panel_types = self._config.get_main_config().get("warmup_panels", "move, temperature, print, extrude")
+        panels = self.get_warmup_panels([p.strip() for p in panel_types.split(",") if p.strip()])
+        if panels:
+            logging.debug(f"Warming up panels: {[panel[0] for panel in panels]}")
+            self.warmup_source = GLib.idle_add(self._warmup_panel, panels, priority=GLib.PRIORITY_LOW)
+
+    def stop_warmup(self):
+        if self.warmup_source is not None:
+            GLib.source_remove(self.warmup_source)
+            self.warmup_source = None
+
+    def _warmup_panel(self, panels):
+        # One slice per idle call: either importing the module or building the panel
+        if not panels or "main_panel" not in self._cur_panels or len(self.panels) >= self.panel_cache_size:
+            self.warmup_source = None
+            return False
+        panel_name, panel_type, title, kwargs = panels[0]
+        if panel_name in self.panels:
+            panels.pop(0)
+            return True
+        try:
+            if panel_type not in self.load_panel:
+                self._import_panel(panel_type)
+                return True
+            panels.pop(0)
+            self._create_panel(panel_name, panel_type, title, **kwargs)
+        except Exception as e:
+            panels.pop(0)
+            logging.error(f"Unable to warm up panel {panel_type}: {e}")
+        return True
+
+    def trim_panels(self):
+        # The least recently shown panels are destroyed, except the pinned ones and the ones in the hierarchy
+        for panel_name in list(self.panels):
+            if len(self.panels) <= self.panel_cache_size:
+                break
+            if panel_name in self.pinned_panels or panel_name in self._cur_panels:
+                continue
+            stats = self.get_panel_stats(panel_name)
+            logging.info(f"Evicting panel {panel_name}: {stats['widgets']} widgets, ~{stats['memory'] // 1024} kB")
+            self.remove_panel(panel_name)
+            logging.debug(f"Panel cache: {self.get_panel_cache_stats()}")
+
+    def remove_panel(self, panel_name):
+        panel = self.panels.pop(panel_name)
+        self.remove_subscription(panel_name)
+        try:
+            panel.destroy()
+        except Exception as e:
+            logging.exception(f"Error destroying panel {panel_name}:\n{e}")
+
+    def get_panel_stats(self, panel_name):
+        # Estimate, the icons and thumbnails are shared and not counted
+        widgets = 0
+        pending = [self.panels[panel_name].get_content()]
+        while pending:
+            widget = pending.pop()
+            widgets += 1
+            if isinstance(widget, Gtk.Container):
+                widget.forall(pending.append)
+        return {"widgets": widgets, "memory": widgets * self.widget_memory}
+
+    def get_panel_timers(self):
+        # Timers of the panels that have any, running or paused
+        panels = {"base_panel": self.base_panel.get_timers()}
+        panels.update({name: panel.get_timers() for name, panel in self.panels.items()})
+        return {name: timers for name, timers in panels.items() if timers}
+
+    def get_panel_cache_stats(self):
+        panels = {name: self.get_panel_stats(name) for name in self.panels}
+        return {
+            "panels": len(panels),
+            "widgets": sum(stats['widgets'] for stats in panels.values()),
+            "memory": sum(stats['memory'] for stats in panels.values()),
+        }
 
     def show_popup_message(self, message, level=3):
         self.close_screensaver()
@@ -566,22 +759,23 @@ class KlipperScreen(Gtk.Window):
         if len(self._cur_panels) <= 0:
             return
         self.base_panel.remove(self.panels[self._cur_panels[-1]].get_content())
-        if hasattr(self.panels[self._cur_panels[-1]], "deactivate"):
-            self.panels[self._cur_panels[-1]].deactivate()
+        self.panels[self._cur_panels[-1]].pause_timers()
+        self.panels[self._cur_panels[-1]].deactivate()
         self.remove_subscription(self._cur_panels[-1])
         if pop is True:
             self._cur_panels.pop()
             if len(self._cur_panels) > 0:
                 self.base_panel.add_content(self.panels[self._cur_panels[-1]])
                 self.base_panel.show_back(len(self._cur_panels) != 1)
-                if hasattr(self.panels[self._cur_panels[-1]], "activate"):
-                    self.panels[self._cur_panels[-1]].activate()
+                self.panels[self._cur_panels[-1]].activate()
+                self.panels[self._cur_panels[-1]].resume_timers()
                 if hasattr(self.panels[self._cur_panels[-1]], "process_update"):
                     self.panels[self._cur_panels[-1]].process_update("notify_status_update",
                                                                      self.printer.get_updates())
                     self.add_subscription(self._cur_panels[-1])
                 if show is True:
                     self.show_all()
+            self.update_subscription()
 
     def _menu_go_back(self, widget=None):
         logging.info("#### Menu go back")
@@ -598,17 +792,18 @@ class KlipperScreen(Gtk.Window):
             self._remove_current_panel()
 
     def add_subscription(self, panel_name):
-        for sub in self.subscriptions:
-            if sub == panel_name:
-                return
-
+        # The panel gets the events of its topics while it's shown
+        if panel_name in self.subscriptions:
+            return
         self.subscriptions.append(panel_name)
+        panel = self.panels[panel_name]
+        for topic in panel.topics:
+            self.events.subscribe(topic, panel.process_update, owner=panel_name)
 
     def remove_subscription(self, panel_name):
-        for i in range(len(self.subscriptions)):
-            if self.subscriptions[i] == panel_name:
-                self.subscriptions.pop(i)
-                return
+        if panel_name in self.subscriptions:
+            self.subscriptions.remove(panel_name)
+            self.events.unsubscribe(panel_name)
 
     def reset_screensaver_timeout(self, *args):
         if self.screensaver_timeout is not None:
@@ -772,7 +967,7 @@ class KlipperScreen(Gtk.Window):
 
         for panel in list(self.panels):
             if panel not in ["printer_select", "splash_screen"]:
-                del self.panels[panel]
+                self.remove_panel(panel)
         for dialog in self.dialogs:
             dialog.destroy()
 
@@ -800,8 +995,8 @@ class KlipperScreen(Gtk.Window):
             return
 
         if prev_state not in ['paused', 'printing']:
-            self.init_printer()
-            self.base_panel._printer = self.printer
+            self.init_printer(self.printer_ready)
+            return
 
         self.printer_ready()
 
@@ -836,7 +1031,7 @@ class KlipperScreen(Gtk.Window):
     def reload_panels(self, *args):
         self._remove_all_panels()
         for panel in list(self.panels):
-            del self.panels[panel]
+            self.remove_panel(panel)
         for dialog in self.dialogs:
             dialog.destroy()
         self.printer.change_state(self.printer.state)
@@ -846,37 +1041,51 @@ class KlipperScreen(Gtk.Window):
         if self.connecting is True:
             return
 
-        if action == "notify_klippy_disconnected":
-            self.printer.change_state("disconnected")
-            return
-        elif action == "notify_klippy_shutdown":
-            self.printer.change_state("shutdown")
-        elif action == "notify_klippy_ready":
-            self.printer.change_state("ready")
-        elif action == "notify_status_update" and self.printer.get_state() != "shutdown":
-            self.printer.process_update(data)
-        elif action == "notify_filelist_changed":
-            logging.debug("Filelist changed: %s", json.dumps(data, indent=2))
-            if self.files is not None:
-                self.files.process_update(data)
-        elif action == "notify_metadata_update":
-            self.files.request_metadata(data['filename'])
-        elif action == "notify_update_response":
-            logging.info(f"{action}: {data}")
-        elif action == "notify_power_changed":
-            logging.debug("Power status changed: %s", data)
-            self.printer.process_power_update(data)
-            self.panels['splash_screen'].check_power_status()
-        elif self.printer.get_state() not in ["error", "shutdown"] and action == "notify_gcode_response":
-            if not (data.startswith("B:") or data.startswith("T:")):
-                if data.startswith("echo: "):
-                    self.show_popup_message(data[6:], 1)
-                elif data.startswith("!! "):
-                    self.show_popup_message(data[3:], 3)
-
-        self.base_panel.process_update(action, data)
-        if self._cur_panels[-1] in self.subscriptions:
-            self.panels[self._cur_panels[-1]].process_update(action, data)
+        self.events.publish(action, data)
+        # The derived topics are only built when something listens to them
+        if action == "notify_status_update" and self.events.status_topics:
+            for obj in data:
+                topic = f"status:{obj}"
+                if self.events.has_subscribers(topic):
+                    self.events.publish(topic, data[obj])
+        elif action == "notify_filelist_changed" and self.events.file_topics:
+            self.events.publish(f"file:{data['action']}", data)
+
+    def subscribe_events(self):
+        # These run before the panels, which subscribe later
+        for topic in ("notify_klippy_disconnected", "notify_klippy_shutdown", "notify_klippy_ready"):
+            self.events.subscribe(topic, self._klippy_state_changed)
+        self.events.subscribe("notify_status_update", lambda topic, data: self.printer.process_update(data),
+                              lambda data: self.printer.get_state() != "shutdown")
+        self.events.subscribe("notify_filelist_changed", self._filelist_changed)
+        self.events.subscribe("notify_metadata_update", self._metadata_update)
+        self.events.subscribe("notify_update_response", lambda topic, data: logging.info(f"{topic}: {data}"))
+        self.events.subscribe("notify_power_changed", self._power_changed)
+        self.events.subscribe("notify_gcode_response", self._gcode_response,
+                              lambda data: self.printer.get_state() not in ["error", "shutdown"])
+
+    def _klippy_state_changed(self, topic, data):
+        self.printer.change_state(topic[len("notify_klippy_"):])
+
+    def _filelist_changed(self, topic, data):
+        logging.debug("Filelist changed: %s", json.dumps(data, indent=2))
+        if self.files is not None:
+            self.files.process_update(data)
+
+    def _metadata_update(self, topic, data):
+        self.files.set_metadata(data['filename'], data)
+
+    def _power_changed(self, topic, data):
+        logging.debug("Power status changed: %s", data)
+        self.printer.process_power_update(data)
+        self.panels['splash_screen'].check_power_status()
+
+    def _gcode_response(self, topic, data):
+        if not (data.startswith("B:") or data.startswith("T:")):
+            if data.startswith("echo: "):
+                self.show_popup_message(data[6:], 1)
+            elif data.startswith("!! "):
+                self.show_popup_message(data[3:], 3)
 
     def _confirm_send_action(self, widget, text, method, params=None):
 
@@ -888,6 +1097,7 @@ class KlipperScreen(Gtk.Window):
         ]
 
         try:
+            from jinja2 import Environment
             env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
             env.install_gettext_translations(self._config.get_lang())
             j2_temp = env.from_string(text)
@@ -954,19 +1164,76 @@ class KlipperScreen(Gtk.Window):
             elif self.printer.get_power_device_status(device) == "on":
                 logging.info("%s is ON", device)
 
-    def init_printer(self):
-
-        state = self.apiclient.get_server_info()
-        if state is False:
+    def init_printer(self, callback=None):
+        # The requests run in a thread, callback runs once the printer has been initialized
+        if callback is not None and callback not in self.init_printer_callbacks:
+            self.init_printer_callbacks.append(callback)
+        if self.init_printer_timeout is not None:
+            GLib.source_remove(self.init_printer_timeout)
+            self.init_printer_timeout = None
+        if self.init_printer_thread is not None and self.init_printer_thread.is_alive():
             return False
-        # Moonraker is ready, set a loop to init the printer
+        startup.mark("moonraker connected")
         self.reinit_count += 1
-        self.init_printer_timeout = GLib.timeout_add_seconds(3, self.init_printer)
+        self.init_printer_thread = threading.Thread(target=self._bootstrap_printer, args=(self.apiclient,),
+                                                    daemon=True)
+        self.init_printer_thread.start()
+        return False
 
+    def _bootstrap_printer(self, apiclient):
+        query = "printer/objects/query?" + "&".join(["configfile"] + PRINTER_BASE_STATUS_OBJECTS)
+        result = {}
+        try:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                pending = {
+                    "server_info": pool.submit(apiclient.get_server_info),
+                    "power_devices": pool.submit(apiclient.send_request, "machine/device_power/devices"),
+                    "printer_info": pool.submit(apiclient.get_printer_info),
+                    "objects": pool.submit(apiclient.send_request, query),
+                    "temperature_store": pool.submit(apiclient.send_request, "server/temperature_store"),
+                }
+                result = {name: request.result() for name, request in pending.items()}
+
+            if result['server_info'] is not False and result['server_info']['result']['klippy_connected'] is not False:
+                if result['printer_info'] is False:
+                    result['error'] = "Unable to get printer info from moonraker"
+                elif result['objects'] is False:
+                    result['error'] = "Error getting printer object data"
+                else:
+                    GLib.idle_add(self._update_splash_screen,
+                                  _("Moonraker: connected") + "\n\n" + _("Initializing printer..."))
+                    status = result['objects']['result']['status']
+                    extra_items = [section for section in status['configfile']['config']
+                                   if section.startswith(PRINTER_DEVICE_PREFIXES) and section not in status]
+                    if extra_items:
+                        extra = apiclient.send_request("printer/objects/query?" + "&".join(extra_items))
+                        if extra is False:
+                            result['error'] = "Error getting printer object data with extra items"
+                        else:
+                            status.update(extra['result']['status'])
+        except Exception as e:
+            logging.exception(f"Error initializing printer:\n{e}")
+            # Retried like an unreachable moonraker
+            result['server_info'] = False
+            result['error'] = f"Error initializing printer: {e}"
+        finally:
+            GLib.idle_add(self._bootstrap_printer_done, apiclient, result)
+
+    def _bootstrap_printer_done(self, apiclient, result):
+        if apiclient is not self.apiclient or self.printer is None:
+            # The printer was changed while initializing
+            return False
+        self.init_printer_thread = None
+
+        state = result['server_info']
+        if state is False:
+            if "error" in result:
+                self._update_splash_screen(result['error'])
+            self.init_printer_timeout = GLib.timeout_add_seconds(3, self.init_printer)
+            return False
         self.shutdown = False
-        powerdevs = self.apiclient.send_request("machine/device_power/devices")
-        if powerdevs is not False:
-            self.printer.configure_power_devices(powerdevs['result'])
+        if result['power_devices'] is not False:
+            self.printer.configure_power_devices(result['power_devices']['result'])
 
         if state['result']['klippy_connected'] is False:
             self.panels['splash_screen'].update_text(
@@ -974,47 +1241,29 @@ class KlipperScreen(Gtk.Window):
                 + f"\n\nKlipper: {state['result']['klippy_state']}\n\n"
                 + _("Retry #%s") % self.reinit_count
             )
+            self.init_printer_timeout = GLib.timeout_add_seconds(3, self.init_printer)
+            return False
+        if "error" in result:
+            self._update_splash_screen(result['error'])
+            self.init_printer_timeout = GLib.timeout_add_seconds(3, self.init_printer)
             return False
-
-        printer_info = self.apiclient.get_printer_info()
-        if printer_info is False:
-            return self._update_splash_screen("Unable to get printer info from moonraker")
-
-        data = self.apiclient.send_request("printer/objects/query?" + "&".join(PRINTER_BASE_STATUS_OBJECTS))
-        if data is False:
-            return self._update_splash_screen("Error getting printer object data")
-
-        config = self.apiclient.send_request("printer/objects/query?configfile")
-        if config is False:
-            return self._update_splash_screen("Error getting printer config data")
 
         # Reinitialize printer, in case the printer was shut down and anything has changed.
-        self.printer.reinit(printer_info['result'], config['result']['status'])
-
+        self.printer.reinit(result['printer_info']['result'], result['objects']['result']['status'])
+        self.base_panel._printer = self.printer
         self.ws_subscribe()
-        extra_items = (self.printer.get_tools()
-                       + self.printer.get_heaters()
-                       + self.printer.get_fans()
-                       + self.printer.get_filament_sensors()
-                       + self.printer.get_output_pins()
-                       )
-
-        data = self.apiclient.send_request("printer/objects/query?" + "&".join(PRINTER_BASE_STATUS_OBJECTS +
-                                                                               extra_items))
-        if data is False:
-            return self._update_splash_screen("Error getting printer object data with extra items")
-
-        tempstore = self.apiclient.send_request("server/temperature_store")
-        if tempstore is not False:
-            self.printer.init_temp_store(tempstore['result'])
-        self.printer.process_update(data['result']['status'])
+        if result['temperature_store'] is not False:
+            self.printer.init_temp_store(result['temperature_store']['result'])
 
         self.files.initialize()
         self.files.refresh_files()
 
         logging.info("Printer initialized")
-        GLib.source_remove(self.init_printer_timeout)
         self.reinit_count = 0
+        callbacks = self.init_printer_callbacks
+        self.init_printer_callbacks = []
+        for callback in callbacks:
+            callback()
         return False
 
     def _update_splash_screen(self, msg):
@@ -1034,14 +1283,16 @@ class KlipperScreen(Gtk.Window):
         self.base_panel_show_all()
         self.ws_subscribe()
         if "job_status" in self.panels:
-            self.remove_subscription("job_status")
-            del self.panels["job_status"]
+            self.remove_panel("job_status")
+        startup.finish("printer ready")
+        self.start_warmup()
 
     def printer_printing(self):
         self.close_screensaver()
         self.close_popup_message()
         self.show_panel('job_status', "job_status", _("Printing"), 2)
         self.base_panel_show_all()
+        startup.finish("printer printing")
         for dialog in self.dialogs:
             dialog.destroy()
 
@@ -1102,7 +1353,6 @@ class KlipperScreen(Gtk.Window):
 
 
 def main():
-    version = functions.get_software_version()
     parser = argparse.ArgumentParser(description="KlipperScreen - A GUI for Klipper")
     homedir = os.path.expanduser("~")
 
@@ -1117,23 +1367,38 @@ def main():
         "-l", "--logfile", default=os.path.join(logdir, "KlipperScreen.log"), metavar='<logfile>',
         help="Location of KlipperScreen logfile output"
     )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="Write a timeline of the startup to the log"
+    )
     args = parser.parse_args()
+    startup.enabled = args.profile_startup
 
-    functions.setup_logging(
+    log_handler = functions.setup_logging(
         os.path.normpath(os.path.expanduser(args.logfile)),
-        version
-    )
+        None
+    )[1]
 
     functions.patch_threading_excepthook()
 
-    logging.info(f"KlipperScreen version: {version}")
-
-    win = KlipperScreen(args, version)
+    win = KlipperScreen(args, "?")
     win.connect("destroy", Gtk.main_quit)
     win.show_all()
+    # git describe runs once the window is up, it isn't needed to start
+    threading.Thread(target=get_version, args=(win, log_handler), daemon=True).start()
+    if startup.enabled:
+        GLib.timeout_add_seconds(120, startup.finish, "printer not ready after 120s")
     Gtk.main()
 
 
+def get_version(win, log_handler):
+    version = functions.get_software_version()
+    logging.info(f"KlipperScreen version: {version}")
+    if log_handler is not None:
+        log_handler.set_rollover_info("version", f"Git Version: {version}")
+    win.version = version
+
+
 if __name__ == "__main__":
     try:
         main()
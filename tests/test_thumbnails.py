@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+try:
+    import gi
+    gi.require_version("Gtk", "3.0")
+    from gi.repository import GLib
+except (ImportError, ValueError):
+    gi = None
+
+if gi is not None:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from ks_includes.thumbnails import ThumbnailCache
+
+
+@unittest.skipIf(gi is None, "PyGObject is not installed")
+class ThumbnailLoadTest(unittest.TestCase):
+
+    def create_cache(self):
+        # Only the attributes KlipperScreen really has, a typo in the name fails instead of being mocked
+        gtk = mock.Mock(spec=["PixbufFromFile", "PixbufFromHttp"])
+        cache = ThumbnailCache.__new__(ThumbnailCache)
+        cache._screen = SimpleNamespace(gtk=gtk)
+        return cache, gtk
+
+    def test_load_local(self):
+        cache, gtk = self.create_cache()
+        thumbnail = {"local": True, "path": "/tmp/file.png"}
+        self.assertIs(cache.load(thumbnail, 100, 50), gtk.PixbufFromFile.return_value)
+        gtk.PixbufFromFile.assert_called_once_with("/tmp/file.png", 100, 50)
+
+    def test_load_http(self):
+        cache, gtk = self.create_cache()
+        thumbnail = {"local": False, "path": ".thumbs/file.png"}
+        self.assertIs(cache.load(thumbnail, 100, 50), gtk.PixbufFromHttp.return_value)
+        gtk.PixbufFromHttp.assert_called_once_with(".thumbs/file.png", 100, 50)
+
+    def test_load_error(self):
+        cache, gtk = self.create_cache()
+        gtk.PixbufFromHttp.side_effect = GLib.Error("not found")
+        self.assertIsNone(cache.load({"local": False, "path": ".thumbs/file.png"}, 100, 50))
+
+
+if __name__ == "__main__":
+    unittest.main()